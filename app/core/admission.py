@@ -0,0 +1,233 @@
+import asyncio
+import collections
+import hashlib
+import logging
+import math
+import time
+from starlette.responses import JSONResponse
+from .auth import cached_user_id
+from .cache import TTLCache
+from .config import settings
+from .metrics import Counter, Histogram
+from .ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Expensive routes by class; everything else is admitted without checks
+ROUTE_CLASSES = {
+    ("POST", "/outreach/generate"): "llm",
+    ("POST", "/outreach/generate/stream"): "llm",
+    ("POST", "/outreach/generate/batch"): "llm",
+    ("POST", "/api/find-email"): "hunter",
+    ("POST", "/api/find-email/bulk"): "hunter",
+    ("POST", "/onboarding/parse"): "parse",
+}
+
+# An idle bucket is full again well within this time, so dropping it is harmless
+BUCKET_IDLE_TTL = 600
+# Burst for a bearer token that has not been verified yet
+UNVERIFIED_TOKEN_BURST = 2
+
+ADMISSION_REJECTED = Counter("sendy_admission_rejected_total", "Requests turned away by admission control.", ("route_class", "reason"))
+ADMISSION_WAIT = Histogram("sendy_admission_wait_seconds", "Time admitted requests spent queued.", ("route_class",))
+
+class RouteClassLimiter:
+    '''
+    Admission state for one route class: per-user token buckets, and a
+    concurrency limit with a bounded FIFO queue. A released slot goes
+    straight to the oldest waiter, so new arrivals cannot overtake the queue.
+    '''
+
+    def __init__(self, name: str, limit: int, user_rate: float, user_burst: int):
+        self.name = name
+        self.limit = limit
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.in_flight = 0
+        self.admitted = 0
+        self.queued = 0
+        self._waiters = collections.deque()
+        self._buckets = TTLCache(maxsize=100000, ttl=BUCKET_IDLE_TTL)
+        # Per address: how many not-yet-seen unverified tokens it may introduce
+        self._new_tokens = TTLCache(maxsize=100000, ttl=BUCKET_IDLE_TTL)
+        # Moving average of how long a slot is held, for Retry-After estimates
+        self._avg_hold = 1.0
+
+    def take_user_token(self, user_key: str, address: str = None) -> float:
+        '''
+        Returns 0 if the user may proceed, otherwise seconds until they may.
+        `address` is given for unverified bearer tokens: a token seen for the
+        first time uses up part of that address's allowance for new tokens,
+        and starts with a small burst.
+        '''
+        if self.user_rate <= 0:
+            return 0.0
+        bucket = self._buckets.get(user_key)
+        if bucket is None:
+            capacity = self.user_burst
+            if address is not None:
+                allowance = self._new_tokens.get(address)
+                if allowance is None:
+                    allowance = TokenBucket(rate=settings.ADMISSION_NEW_TOKEN_RATE, capacity=settings.ADMISSION_NEW_TOKEN_BURST)
+                self._new_tokens.set(address, allowance)
+                if not allowance.try_acquire():
+                    return allowance.wait_time()
+                capacity = min(self.user_burst, UNVERIFIED_TOKEN_BURST)
+            bucket = TokenBucket(rate=self.user_rate, capacity=capacity)
+        self._buckets.set(user_key, bucket)  # Refreshes the idle TTL
+        if bucket.try_acquire():
+            return 0.0
+        return bucket.wait_time()
+
+    def refund_user_token(self, user_key: str):
+        bucket = self._buckets.get(user_key)
+        if bucket is not None:
+            bucket.tokens = min(bucket.capacity, bucket.tokens + 1)
+
+    def has_room(self) -> bool:
+        return self.in_flight < self.limit or len(self._waiters) < settings.ADMISSION_QUEUE_SIZE
+
+    def retry_after(self) -> int:
+        # Roughly how long the requests ahead take to drain through the slots
+        return max(1, math.ceil(self._avg_hold * (len(self._waiters) + 1) / self.limit))
+
+    async def acquire(self, timeout: float) -> bool:
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            # wait_for can time out after release() already handed this waiter
+            # the slot (Python 3.12+); pass it on rather than leak it
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            self._forget(waiter)
+            return False
+        except asyncio.CancelledError:
+            # Client went away; if a slot was handed over meanwhile, pass it on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            self._forget(waiter)
+            raise
+        self.admitted += 1
+        return True
+
+    def _forget(self, waiter):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self, held: float = None):
+        if held is not None:
+            self._avg_hold += 0.1 * (held - self._avg_hold)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # The slot moves to the waiter; in_flight is unchanged
+                return
+        self.in_flight -= 1
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "users": len(self._buckets),
+        }
+
+_limiters = {
+    "llm": RouteClassLimiter("llm", settings.ADMISSION_LLM_CONCURRENCY, settings.ADMISSION_LLM_USER_RATE, settings.ADMISSION_LLM_USER_BURST),
+    "hunter": RouteClassLimiter("hunter", settings.ADMISSION_HUNTER_CONCURRENCY, settings.ADMISSION_HUNTER_USER_RATE, settings.ADMISSION_HUNTER_USER_BURST),
+    "parse": RouteClassLimiter("parse", settings.ADMISSION_PARSE_CONCURRENCY, settings.ADMISSION_PARSE_USER_RATE, settings.ADMISSION_PARSE_USER_BURST),
+}
+
+def get_admission_stats():
+    return {name: limiter.stats() for name, limiter in _limiters.items()}
+
+def _client_address(headers: dict, scope) -> str:
+    forwarded = headers.get(b"x-forwarded-for")
+    if forwarded:
+        # The proxy appends the address it saw; earlier entries come from the client
+        return forwarded.split(b",")[-1].strip().decode("latin-1")
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+def _client_key(scope):
+    '''
+    (bucket key, address) for a request. Verified tokens are keyed by user id
+    and other bearer tokens by a hash of the token; the address is returned
+    for the latter, so each address can only introduce new tokens at a bounded
+    rate. Anonymous callers are keyed by address. Never calls Google.
+    '''
+    headers = dict(scope.get("headers") or [])
+    authorization = headers.get(b"authorization")
+    if authorization:
+        user_id = cached_user_id(authorization.decode("latin-1"))
+        if user_id:
+            return "user:" + user_id, None
+        token = "token:" + hashlib.sha256(authorization).hexdigest()[:16]
+        return token, _client_address(headers, scope)
+    return "ip:" + _client_address(headers, scope), None
+
+async def _reject(scope, receive, send, status_code: int, detail: str, retry_after: int):
+    response = JSONResponse({"detail": detail}, status_code=status_code, headers={"Retry-After": str(retry_after)})
+    await response(scope, receive, send)
+
+class AdmissionMiddleware:
+    '''
+    Pure ASGI admission control for the routes in ROUTE_CLASSES.
+
+    A request is turned away with 429 when the caller's token bucket for the
+    route class is empty, and with 503 when the class's queue is full or no
+    slot frees up within ADMISSION_MAX_WAIT seconds. Both carry Retry-After.
+    The slot is held until the response (including a stream) has been sent.
+    '''
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        route_class = None
+        if scope["type"] == "http" and settings.ADMISSION_CONTROL:
+            route_class = ROUTE_CLASSES.get((scope["method"], scope["path"].rstrip("/") or "/"))
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = _limiters[route_class]
+        user_key, address = _client_key(scope)
+        wait = limiter.take_user_token(user_key, address)
+        if wait:
+            ADMISSION_REJECTED.inc(route_class, "user_rate")
+            await _reject(scope, receive, send, 429, "Too many requests, please slow down", math.ceil(wait))
+            return
+
+        if not limiter.has_room():
+            limiter.refund_user_token(user_key)
+            ADMISSION_REJECTED.inc(route_class, "queue_full")
+            logger.warning(f"[Admission] {route_class} queue full ({limiter.in_flight} in flight)")
+            await _reject(scope, receive, send, 503, "Server busy, please retry shortly", limiter.retry_after())
+            return
+
+        started = time.monotonic()
+        if not await limiter.acquire(settings.ADMISSION_MAX_WAIT):
+            limiter.refund_user_token(user_key)
+            ADMISSION_REJECTED.inc(route_class, "timeout")
+            await _reject(scope, receive, send, 503, "Server busy, please retry shortly", limiter.retry_after())
+            return
+
+        admitted = time.monotonic()
+        ADMISSION_WAIT.observe(admitted - started, route_class)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.monotonic() - admitted)
@@ -1,25 +1,132 @@
+import hashlib
 import logging
-import requests as py_requests
+import time
+import jwt
 from fastapi import Header, HTTPException
+from .cache import TTLCache, SingleFlight
+from .clients import upstream_get
+from .config import settings
+from .jwks import JWKSCache
 
 logger = logging.getLogger(__name__)
 
-async def get_user_id(authorization: str = Header(None)):
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Missing auth token")
-    
+# Verified tokens keyed by a hash of the Authorization header.
+# A cached None marks a token Google rejected (negative entry).
+_token_cache = TTLCache(maxsize=settings.AUTH_CACHE_SIZE, ttl=settings.AUTH_CACHE_TTL)
+_verify_flight = SingleFlight()
+_MISS = object()
+
+# UserInfo answers that mean the token itself is bad (cached as a negative entry)
+TOKEN_REJECTED_STATUSES = (400, 401, 403)
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+GOOGLE_CLIENT_IDS = [c.strip() for c in (settings.GOOGLE_CLIENT_ID or "").split(",") if c.strip()]
+_google_jwks = JWKSCache(settings.GOOGLE_JWKS_URL, refresh_interval=settings.GOOGLE_JWKS_REFRESH)
+
+def _token_key(authorization: str) -> str:
+    return hashlib.sha256(authorization.encode("utf-8")).hexdigest()
+
+async def _fetch_google_user_id(authorization: str):
     # Verify Access Token via Google's UserInfo API
+    userinfo_res = await upstream_get(
+        "google",
+        "/oauth2/v3/userinfo",
+        headers={"Authorization": authorization}
+    )
+    if userinfo_res.is_success:
+        user_data = userinfo_res.json()
+        return user_data['sub'] # Unique Google ID
+
+    logger.warning(f"UserInfo API failed (Status {userinfo_res.status_code}): {userinfo_res.text}")
+    if userinfo_res.status_code in TOKEN_REJECTED_STATUSES:
+        return None
+    # Google could not answer (rate limit, outage); raise so nothing is cached
+    userinfo_res.raise_for_status()
+    raise RuntimeError(f"Unexpected UserInfo status {userinfo_res.status_code}")
+
+def _bearer_token(authorization: str) -> str:
+    scheme, _, token = authorization.partition(" ")
+    return token.strip() if scheme.lower() == "bearer" else authorization.strip()
+
+def _is_id_token(token: str) -> bool:
+    # Signed ID tokens are JWTs; Google access tokens are opaque
+    return bool(GOOGLE_CLIENT_IDS) and token.count(".") == 2
+
+async def _verify_id_token(token: str):
+    '''
+    Verify a Google ID token locally against the cached JWKS key set.
+    Returns the claims, or None if the token is not acceptable.
+    '''
     try:
-        userinfo_res = py_requests.get(
-            "https://www.googleapis.com/oauth2/v3/userinfo",
-            headers={"Authorization": authorization}
+        header = jwt.get_unverified_header(token)
+        key = await _google_jwks.get_key(header.get("kid"))
+        if key is None:
+            logger.warning(f"ID token signed with unknown key: {header.get('kid')}")
+            return None
+        claims = jwt.decode(
+            token,
+            key=key,
+            algorithms=["RS256"],
+            audience=GOOGLE_CLIENT_IDS,
+            options={"require": ["exp", "iss", "aud", "sub"]}
         )
-        if userinfo_res.ok:
-            user_data = userinfo_res.json()
-            return user_data['sub'] # Unique Google ID
-        else:
-            logger.warning(f"UserInfo API failed (Status {userinfo_res.status_code}): {userinfo_res.text}")
+    except jwt.InvalidTokenError as e:
+        logger.warning(f"ID token rejected: {e}")
+        return None
+
+    if claims.get("iss") not in GOOGLE_ISSUERS:
+        logger.warning(f"ID token rejected: unexpected issuer {claims.get('iss')}")
+        return None
+    return claims
+
+async def _verify_token(key: str, authorization: str):
+    token = _bearer_token(authorization)
+    ttl = None
+    if _is_id_token(token):
+        claims = await _verify_id_token(token)
+        user_id = claims["sub"] if claims else None
+        if claims:
+            # Never cache an ID token past its own expiry
+            ttl = min(settings.AUTH_CACHE_TTL, max(1, int(claims["exp"] - time.time())))
+    else:
+        user_id = await _fetch_google_user_id(authorization)
+
+    if user_id:
+        _token_cache.set(key, user_id, ttl=ttl)
+    else:
+        _token_cache.set(key, None, ttl=settings.AUTH_NEGATIVE_CACHE_TTL)
+    return user_id
+
+async def get_user_id(authorization: str = Header(None)):
+    if not authorization:
+        raise HTTPException(status_code=401, detail="Missing auth token")
+
+    key = _token_key(authorization)
+    cached = _token_cache.get(key, _MISS)
+    if cached is not _MISS:
+        if cached is None:
             raise HTTPException(status_code=401, detail="Invalid or expired token")
+        return cached
+
+    # Concurrent requests with the same uncached token share one verification
+    try:
+        user_id = await _verify_flight.do(key, _verify_token, key, authorization)
     except Exception as e:
         logger.error(f"Token verification failed: {e}")
         raise HTTPException(status_code=401, detail="Authentication failed")
+
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    return user_id
+
+def cached_user_id(authorization: str):
+    '''
+    The user id for an Authorization header that was verified recently, or
+    None. Never calls Google.
+    '''
+    return _token_cache.peek(_token_key(authorization))
+
+def get_auth_cache_stats():
+    '''
+    Hit/miss counters for the token cache, plus how many verifications were shared.
+    '''
+    return {**_token_cache.stats(), "shared_verifications": _verify_flight.shared}
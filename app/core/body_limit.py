@@ -0,0 +1,63 @@
+import logging
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Room for multipart boundaries and part headers around the uploaded file
+MULTIPART_OVERHEAD = 64 * 1024
+
+TOO_LARGE_DETAIL = f"File too large. Maximum size is {settings.RESUME_MAX_BYTES // (1024 * 1024)} MB."
+
+# Request body limits in bytes, by route
+BODY_LIMITS = {
+    ("POST", "/onboarding/parse"): settings.RESUME_MAX_BYTES + MULTIPART_OVERHEAD,
+}
+
+class BodySizeLimitMiddleware:
+    '''
+    Pure ASGI request body limit for the routes in BODY_LIMITS.
+
+    Starlette spools a whole multipart body before the route runs, so a size
+    check in the route comes too late. Here a declared Content-Length over
+    the limit is answered with 413 before anything is read, and a body sent
+    without one (chunked) is cut off with 413 once it passes the limit.
+    '''
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        limit = None
+        if scope["type"] == "http":
+            limit = BODY_LIMITS.get((scope["method"], scope["path"].rstrip("/") or "/"))
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        try:
+            declared = int(headers.get(b"content-length", b"-1"))
+        except ValueError:
+            declared = -1
+        if declared > limit:
+            logger.warning(f"[BodyLimit] Rejected {scope['path']} upload of {declared} bytes")
+            response = JSONResponse({"detail": TOO_LARGE_DETAIL}, status_code=413, headers={"Connection": "close"})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    logger.warning(f"[BodyLimit] Cut off {scope['path']} upload after {received} bytes")
+                    # Raised inside body parsing, so the route answers with this status
+                    raise HTTPException(status_code=413, detail=TOO_LARGE_DETAIL)
+            return message
+
+        await self.app(scope, limited_receive, send)
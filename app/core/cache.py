@@ -0,0 +1,121 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    '''
+    Bounded in-process cache with per-entry TTL and LRU eviction.
+    A TTL of 0 means "do not cache"; pass expires=False for entries that
+    only leave through LRU eviction.
+    '''
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300, expires: bool = True):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.expires = expires
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key, default=None):
+        '''
+        Like get(), but without counting a hit or miss or refreshing LRU order.
+        '''
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            return default
+        return value
+
+    def set(self, key, value, ttl: float = None):
+        if self.expires:
+            ttl = self.ttl if ttl is None else ttl
+            if ttl <= 0:
+                # Caching disabled for this entry; do not leave an older value behind
+                self._data.pop(key, None)
+                return
+            expires_at = time.monotonic() + ttl
+        else:
+            expires_at = None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[0]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class SingleFlight:
+    '''
+    Collapses concurrent calls for the same key into one in-flight coroutine.
+    Callers that arrive while a call is running await the same result.
+    '''
+
+    def __init__(self):
+        self._inflight = {}
+        self.shared = 0
+
+    async def do(self, key, fn, *args, **kwargs):
+        task = self._inflight.get(key)
+        if task is not None:
+            self.shared += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(fn(*args, **kwargs))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._finish(key, t))
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        self._inflight.pop(key, None)
+        # Mark the exception as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def __contains__(self, key):
+        return key in self._inflight
+
+    def __len__(self):
+        return len(self._inflight)
@@ -1,20 +1,132 @@
+import asyncio
 import logging
-from anthropic import Anthropic
-from supabase import create_client, Client
+import threading
+import httpx
+from urllib.parse import urlsplit
 from .config import settings
+from .metrics import upstream_timer
+from .startup import timed_load
 
 logger = logging.getLogger(__name__)
 
-# Initialize Clients
-supabase: Client = None
-anthropic_client: Anthropic = None
+# Supabase and Anthropic clients are built on first use: importing their SDKs
+# dominates cold start, and most requests only need one of them (or neither)
+_supabase = None
+_async_anthropic_client = None
+_client_lock = threading.Lock()
 
-if not all([settings.SUPABASE_URL, settings.SUPABASE_KEY, settings.ANTHROPIC_API_KEY]):
+CLIENTS_CONFIGURED = all([settings.SUPABASE_URL, settings.SUPABASE_KEY, settings.ANTHROPIC_API_KEY])
+if not CLIENTS_CONFIGURED:
     logger.error("CRITICAL: Missing required environment variables.")
-else:
-    try:
-        supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
-        anthropic_client = Anthropic(api_key=settings.ANTHROPIC_API_KEY)
-        logger.info("Clients (Supabase, Anthropic) initialized successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize clients: {e}")
+
+def get_supabase():
+    '''
+    The shared Supabase client, or None if it is not configured.
+    '''
+    global _supabase
+    if _supabase is None and CLIENTS_CONFIGURED:
+        with _client_lock:
+            if _supabase is None:
+                try:
+                    with timed_load("supabase"):
+                        from supabase import create_client
+                        _supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+                    logger.info("Supabase client initialized")
+                except Exception as e:
+                    logger.error(f"Failed to initialize Supabase client: {e}")
+    return _supabase
+
+def get_async_anthropic_client():
+    '''
+    The shared AsyncAnthropic client, or None if it is not configured.
+    '''
+    global _async_anthropic_client
+    if _async_anthropic_client is None and CLIENTS_CONFIGURED:
+        with _client_lock:
+            if _async_anthropic_client is None:
+                try:
+                    with timed_load("anthropic"):
+                        from anthropic import AsyncAnthropic
+                        _async_anthropic_client = AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
+                    logger.info("Anthropic client initialized")
+                except Exception as e:
+                    logger.error(f"Failed to initialize Anthropic client: {e}")
+    return _async_anthropic_client
+
+# Shared async HTTP clients, one keep-alive pool per upstream.
+# Retries only cover failures where the request never reached the upstream
+# (connect errors) or the upstream said it is temporarily unavailable.
+UPSTREAMS = {
+    "google": {
+        "base_url": settings.GOOGLE_API_BASE,
+        "timeout": settings.GOOGLE_TIMEOUT,
+        "retries": 2,
+        "max_connections": 50,
+    },
+    "hunter": {
+        "base_url": settings.HUNTER_API_BASE,
+        "timeout": settings.HUNTER_TIMEOUT,
+        "retries": 1,
+        "max_connections": 20,
+    },
+    "extpay": {
+        "base_url": settings.EXTPAY_API_BASE,
+        "timeout": settings.EXTPAY_TIMEOUT,
+        "retries": 2,
+        "max_connections": 20,
+    },
+}
+RETRY_STATUSES = {502, 503, 504}
+RETRY_BACKOFF = 0.2
+
+_http_clients = {}
+
+def get_http_client(name: str) -> httpx.AsyncClient:
+    client = _http_clients.get(name)
+    if client is None or client.is_closed:
+        cfg = UPSTREAMS[name]
+        client = httpx.AsyncClient(
+            base_url=cfg["base_url"],
+            timeout=httpx.Timeout(cfg["timeout"], connect=min(cfg["timeout"], 3.0)),
+            limits=httpx.Limits(
+                max_connections=cfg["max_connections"],
+                max_keepalive_connections=cfg["max_connections"],
+                keepalive_expiry=60,
+            ),
+        )
+        _http_clients[name] = client
+    return client
+
+async def start_http_clients():
+    for name in UPSTREAMS:
+        get_http_client(name)
+    logger.info(f"HTTP clients started: {', '.join(UPSTREAMS)}")
+
+async def close_http_clients():
+    clients = list(_http_clients.values())
+    _http_clients.clear()
+    for client in clients:
+        await client.aclose()
+    logger.info("HTTP clients closed")
+
+async def upstream_get(name: str, url: str, **kwargs) -> httpx.Response:
+    '''
+    GET against a named upstream using its pooled client, timeout and retry policy.
+    '''
+    retries = UPSTREAMS[name]["retries"]
+    operation = urlsplit(url).path
+    for attempt in range(retries + 1):
+        try:
+            async with upstream_timer(name, operation) as timer:
+                res = await get_http_client(name).get(url, **kwargs)
+                if res.status_code >= 500:
+                    timer.fail()
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            if attempt >= retries:
+                raise
+            logger.warning(f"[{name}] {type(e).__name__} on attempt {attempt + 1}, retrying")
+        else:
+            if res.status_code not in RETRY_STATUSES or attempt >= retries:
+                return res
+            logger.warning(f"[{name}] HTTP {res.status_code} on attempt {attempt + 1}, retrying")
+        await asyncio.sleep(RETRY_BACKOFF * (2 ** attempt))
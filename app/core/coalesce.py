@@ -0,0 +1,35 @@
+import hashlib
+import json
+import logging
+from pydantic import BaseModel
+from .cache import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Identical requests from the same user that arrive while one is still running
+# share its result (double clicks, popup re-renders). Anything the handler
+# does inside the flight, such as charging usage, happens once per group.
+_request_flight = SingleFlight()
+
+def request_key(route: str, user_id: str, body: BaseModel, *extra) -> str:
+    '''
+    Canonical hash of route, user, request body and any extra inputs that
+    change the answer (e.g. the ExtPay key, which decides the credit limit).
+    '''
+    canonical = json.dumps(
+        [route, user_id, body.model_dump(), extra],
+        sort_keys=True, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+async def coalesce(key: str, fn, *args, **kwargs):
+    '''
+    Run fn(*args, **kwargs), or attach to the identical call already in flight.
+    The call keeps running if the caller that started it disconnects.
+    '''
+    if key in _request_flight:
+        logger.info(f"[Coalesce] Request {key[:12]} joined an in-flight duplicate")
+    return await _request_flight.do(key, fn, *args, **kwargs)
+
+def get_coalesce_stats():
+    return {"inflight": len(_request_flight), "coalesced": _request_flight.shared}
@@ -1,10 +1,16 @@
 from pydantic_settings import BaseSettings
 from typing import Optional
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Set by the Vercel (vercel.json deploys through @vercel/python) and AWS Lambda
+# runtimes. Instances there are frozen or reclaimed between requests and do not
+# share memory or /tmp, so in-process background work is not reliable.
+SERVERLESS = bool(os.getenv("VERCEL") or os.getenv("AWS_LAMBDA_FUNCTION_NAME"))
+
 class Settings(BaseSettings):
     SUPABASE_URL: str = os.getenv("SUPABASE_URL")
     SUPABASE_KEY: str = os.getenv("SUPABASE_KEY")
@@ -12,4 +18,132 @@ class Settings(BaseSettings):
     ANTHROPIC_MODEL: str = os.getenv("ANTHROPIC_MODEL", "claude-sonnet-4-5")
     HUNTER_API_KEY: Optional[str] = os.getenv("HUNTER_API_KEY")
 
+    # Upstream HTTP APIs (base URLs are overridable for local stand-ins)
+    GOOGLE_API_BASE: str = os.getenv("GOOGLE_API_BASE", "https://www.googleapis.com")
+    GOOGLE_TIMEOUT: float = float(os.getenv("GOOGLE_TIMEOUT", "5"))
+    HUNTER_API_BASE: str = os.getenv("HUNTER_API_BASE", "https://api.hunter.io")
+    HUNTER_TIMEOUT: float = float(os.getenv("HUNTER_TIMEOUT", "10"))
+    EXTPAY_API_BASE: str = os.getenv("EXTPAY_API_BASE", "https://extensionpay.com")
+    EXTPAY_TIMEOUT: float = float(os.getenv("EXTPAY_TIMEOUT", "5"))
+
+    # ExtensionPay tier cache (stale-while-revalidate)
+    TIER_CACHE_SIZE: int = int(os.getenv("TIER_CACHE_SIZE", "10000"))
+    TIER_FRESH_TTL: int = int(os.getenv("TIER_FRESH_TTL", "600"))
+    TIER_STALE_TTL: int = int(os.getenv("TIER_STALE_TTL", str(7 * 24 * 3600)))
+
+    # Google ID tokens (verified locally). Comma-separated OAuth client IDs.
+    GOOGLE_CLIENT_ID: Optional[str] = os.getenv("GOOGLE_CLIENT_ID")
+    GOOGLE_JWKS_URL: str = os.getenv("GOOGLE_JWKS_URL", "https://www.googleapis.com/oauth2/v3/certs")
+    GOOGLE_JWKS_REFRESH: int = int(os.getenv("GOOGLE_JWKS_REFRESH", "3600"))
+
+    # Auth token cache
+    AUTH_CACHE_SIZE: int = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+    AUTH_CACHE_TTL: int = int(os.getenv("AUTH_CACHE_TTL", "300"))
+    AUTH_NEGATIVE_CACHE_TTL: int = int(os.getenv("AUTH_NEGATIVE_CACHE_TTL", "30"))
+
+    # Resume text extraction
+    RESUME_MAX_BYTES: int = int(os.getenv("RESUME_MAX_BYTES", str(5 * 1024 * 1024)))
+    RESUME_MAX_PAGES: int = int(os.getenv("RESUME_MAX_PAGES", "10"))
+    RESUME_PAGES_PER_TASK: int = int(os.getenv("RESUME_PAGES_PER_TASK", "2"))
+    # Size of the extraction process pool; 0 (the default when serverless) runs
+    # extraction in the threadpool instead
+    RESUME_PARSE_WORKERS: int = int(os.getenv("RESUME_PARSE_WORKERS", "0" if SERVERLESS else str(min(4, os.cpu_count() or 1))))
+
+    # Parsed resume cache (in-memory LRU, plus an on-disk store when a directory is set)
+    RESUME_CACHE_SIZE: int = int(os.getenv("RESUME_CACHE_SIZE", "256"))
+    RESUME_CACHE_DIR: Optional[str] = os.getenv("RESUME_CACHE_DIR")
+
+    # Email-finder result cache shared across workers ("sqlite", "supabase" or "off")
+    EMAIL_CACHE_BACKEND: str = os.getenv("EMAIL_CACHE_BACKEND", "sqlite")
+    EMAIL_CACHE_PATH: str = os.getenv("EMAIL_CACHE_PATH", os.path.join(tempfile.gettempdir(), "sendy_email_cache.sqlite3"))
+    EMAIL_CACHE_TTL: int = int(os.getenv("EMAIL_CACHE_TTL", str(30 * 24 * 3600)))
+    EMAIL_CACHE_NEGATIVE_TTL: int = int(os.getenv("EMAIL_CACHE_NEGATIVE_TTL", str(24 * 3600)))
+
+    # Email patterns learned per company from Hunter results; find-email answers
+    # from the pattern without calling Hunter once it is seen often and consistently
+    EMAIL_PATTERNS: bool = os.getenv("EMAIL_PATTERNS", "true").lower() in ("1", "true", "yes")
+    EMAIL_PATTERN_MIN_SAMPLES: int = int(os.getenv("EMAIL_PATTERN_MIN_SAMPLES", "5"))
+    EMAIL_PATTERN_MIN_CONFIDENCE: float = float(os.getenv("EMAIL_PATTERN_MIN_CONFIDENCE", "0.8"))
+    EMAIL_PATTERN_CACHE_TTL: int = int(os.getenv("EMAIL_PATTERN_CACHE_TTL", "600"))
+
+    # Hunter attempt strategy: "serial", "parallel" or "hedged" (start the next
+    # attempt if the previous one has not answered after HUNTER_HEDGE_DELAY_MS)
+    HUNTER_STRATEGY: str = os.getenv("HUNTER_STRATEGY", "hedged")
+    HUNTER_HEDGE_DELAY_MS: int = int(os.getenv("HUNTER_HEDGE_DELAY_MS", "1500"))
+    HUNTER_DEADLINE_MS: int = int(os.getenv("HUNTER_DEADLINE_MS", "12000"))
+
+    # Hunter request rate shared by all lookups, and bulk lookup limits
+    HUNTER_RATE_LIMIT: float = float(os.getenv("HUNTER_RATE_LIMIT", "10"))
+    HUNTER_BULK_CONCURRENCY: int = int(os.getenv("HUNTER_BULK_CONCURRENCY", "5"))
+    HUNTER_BULK_MAX_ITEMS: int = int(os.getenv("HUNTER_BULK_MAX_ITEMS", "200"))
+
+    # Write-behind usage logging. Off by default when serverless: a frozen or
+    # reclaimed instance would lose its queue and spool, and other instances
+    # never see its queued events when they check credits.
+    USAGE_WRITE_BEHIND: bool = os.getenv("USAGE_WRITE_BEHIND", "false" if SERVERLESS else "true").lower() in ("1", "true", "yes")
+    USAGE_FLUSH_BATCH: int = int(os.getenv("USAGE_FLUSH_BATCH", "100"))
+    USAGE_FLUSH_INTERVAL: float = float(os.getenv("USAGE_FLUSH_INTERVAL", "2"))
+    USAGE_MAX_PENDING: int = int(os.getenv("USAGE_MAX_PENDING", "50000"))
+    USAGE_SPOOL_DIR: Optional[str] = os.getenv("USAGE_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "sendy_usage_spool"))
+    USAGE_SPOOL_MAX_BYTES: int = int(os.getenv("USAGE_SPOOL_MAX_BYTES", str(1024 * 1024)))
+
+    # Profile read-through cache
+    PROFILE_CACHE_SIZE: int = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))
+    PROFILE_CACHE_TTL: int = int(os.getenv("PROFILE_CACHE_TTL", "60"))
+
+    # Batch outreach generation: concurrent Claude calls per user and per process
+    OUTREACH_BATCH_MAX_ITEMS: int = int(os.getenv("OUTREACH_BATCH_MAX_ITEMS", "50"))
+    OUTREACH_USER_CONCURRENCY: int = int(os.getenv("OUTREACH_USER_CONCURRENCY", "3"))
+    OUTREACH_GLOBAL_CONCURRENCY: int = int(os.getenv("OUTREACH_GLOBAL_CONCURRENCY", "20"))
+
+    # Request logging: records go through a background queue; request bodies
+    # are logged for a sampled share of requests, up to LOG_BODY_MAX_BYTES
+    LOG_QUEUE: bool = os.getenv("LOG_QUEUE", "true").lower() in ("1", "true", "yes")
+    LOG_BODY_MAX_BYTES: int = int(os.getenv("LOG_BODY_MAX_BYTES", "2048"))
+    LOG_BODY_SAMPLE_RATE: float = float(os.getenv("LOG_BODY_SAMPLE_RATE", "1.0"))
+
+    # Metrics: Server-Timing response header, and an optional bearer token for /metrics
+    SERVER_TIMING: bool = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+    METRICS_TOKEN: Optional[str] = os.getenv("METRICS_TOKEN")
+
+    # Browser cache lifetime for /static URLs without a fingerprint
+    STATIC_MAX_AGE: int = int(os.getenv("STATIC_MAX_AGE", "3600"))
+
+    # Generated outreach emails, reused for repeat views of the same recipient
+    OUTREACH_CACHE_SIZE: int = int(os.getenv("OUTREACH_CACHE_SIZE", "5000"))
+    OUTREACH_CACHE_TTL: int = int(os.getenv("OUTREACH_CACHE_TTL", str(24 * 3600)))
+
+    # Contact-form mail, delivered by a background worker from a local spool.
+    # Delivery is on when SMTP_PASSWORD is set, or when SMTP_AUTH is off (a local relay).
+    CONTACT_EMAIL: str = os.getenv("CONTACT_EMAIL", "sendynetworking@gmail.com")
+    SMTP_HOST: str = os.getenv("SMTP_HOST", "smtp.gmail.com")
+    SMTP_PORT: int = int(os.getenv("SMTP_PORT", "465"))
+    SMTP_SSL: bool = os.getenv("SMTP_SSL", "true").lower() in ("1", "true", "yes")
+    SMTP_AUTH: bool = os.getenv("SMTP_AUTH", "true").lower() in ("1", "true", "yes")
+    SMTP_USER: Optional[str] = os.getenv("SMTP_USER")
+    SMTP_PASSWORD: Optional[str] = os.getenv("SMTP_PASSWORD", os.getenv("GMAIL_APP_PASSWORD"))
+    SMTP_TIMEOUT: float = float(os.getenv("SMTP_TIMEOUT", "10"))
+    SMTP_IDLE_TIMEOUT: float = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
+    SMTP_MAX_ATTEMPTS: int = int(os.getenv("SMTP_MAX_ATTEMPTS", "8"))
+    CONTACT_SPOOL_DIR: Optional[str] = os.getenv("CONTACT_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "sendy_contact_spool"))
+
+    # Admission control for expensive routes, per route class (llm, hunter, parse):
+    # a per-user token bucket (requests/second and burst), a process-wide
+    # concurrency limit, and a bounded FIFO queue with a maximum wait
+    ADMISSION_CONTROL: bool = os.getenv("ADMISSION_CONTROL", "true").lower() in ("1", "true", "yes")
+    ADMISSION_QUEUE_SIZE: int = int(os.getenv("ADMISSION_QUEUE_SIZE", "100"))
+    ADMISSION_MAX_WAIT: float = float(os.getenv("ADMISSION_MAX_WAIT", "5"))
+    ADMISSION_LLM_CONCURRENCY: int = int(os.getenv("ADMISSION_LLM_CONCURRENCY", "32"))
+    ADMISSION_LLM_USER_RATE: float = float(os.getenv("ADMISSION_LLM_USER_RATE", "0.5"))
+    ADMISSION_LLM_USER_BURST: int = int(os.getenv("ADMISSION_LLM_USER_BURST", "10"))
+    ADMISSION_HUNTER_CONCURRENCY: int = int(os.getenv("ADMISSION_HUNTER_CONCURRENCY", "64"))
+    ADMISSION_HUNTER_USER_RATE: float = float(os.getenv("ADMISSION_HUNTER_USER_RATE", "2"))
+    ADMISSION_HUNTER_USER_BURST: int = int(os.getenv("ADMISSION_HUNTER_USER_BURST", "30"))
+    ADMISSION_PARSE_CONCURRENCY: int = int(os.getenv("ADMISSION_PARSE_CONCURRENCY", "8"))
+    ADMISSION_PARSE_USER_RATE: float = float(os.getenv("ADMISSION_PARSE_USER_RATE", "0.1"))
+    ADMISSION_PARSE_USER_BURST: int = int(os.getenv("ADMISSION_PARSE_USER_BURST", "5"))
+    # Unverified bearer tokens an address may introduce (bounds minting tokens for fresh buckets)
+    ADMISSION_NEW_TOKEN_RATE: float = float(os.getenv("ADMISSION_NEW_TOKEN_RATE", "1"))
+    ADMISSION_NEW_TOKEN_BURST: int = int(os.getenv("ADMISSION_NEW_TOKEN_BURST", "30"))
+
 settings = Settings()
@@ -0,0 +1,277 @@
+import fcntl
+import glob
+import heapq
+import json
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from email.mime.text import MIMEText
+from fastapi.concurrency import run_in_threadpool
+from .config import settings
+from .metrics import upstream_timer
+
+logger = logging.getLogger(__name__)
+
+# Retry delays double from RETRY_BASE_SECONDS up to RETRY_MAX_SECONDS
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 15 * 60
+# How often the worker looks for spooled messages it was not handed directly
+# (left behind by a restart, or queued by another worker process)
+SPOOL_RESCAN_SECONDS = 60
+
+_STOP = object()
+
+def _build_message(message: dict) -> MIMEText:
+    body = (
+        f"Name: {message['name']}\n"
+        f"Email: {message['email']}\n\n"
+        f"Message:\n{message['message']}"
+    )
+    msg = MIMEText(body)
+    msg["Subject"] = f"[SENDY CONTACT FORM]: {message['name']}"
+    msg["From"] = settings.CONTACT_EMAIL
+    msg["To"] = settings.CONTACT_EMAIL
+    msg["Reply-To"] = message["email"]
+    return msg
+
+class ContactMailer:
+    '''
+    Background delivery of contact-form mail.
+
+    send() writes the message to a spool file and returns; a worker thread
+    delivers it over an SMTP connection that stays open between messages
+    (closed after SMTP_IDLE_TIMEOUT idle seconds). Failed deliveries are
+    retried with exponential backoff; after SMTP_MAX_ATTEMPTS the spool file
+    is renamed to .dead for manual follow-up. A spool file is locked while it
+    is being sent, so workers sharing a spool directory never send it twice.
+    '''
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._smtp = None
+        self._last_used = 0.0
+        self.queued = 0
+        self.sent = 0
+        self.failures = 0
+        self.dead = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(settings.SMTP_PASSWORD) or not settings.SMTP_AUTH
+
+    # Spool
+
+    def _spool_path(self, message_id: str) -> str:
+        return os.path.join(settings.CONTACT_SPOOL_DIR, f"contact-{message_id}.json")
+
+    def _write_spool(self, message: dict) -> str:
+        path = self._spool_path(message["id"])
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(message, f)
+            f.flush()
+            os.fsync(f.fileno())
+        # Atomic, so the worker never reads a half-written message
+        os.replace(tmp_path, path)
+        return path
+
+    def _scan_spool(self) -> list:
+        due = []
+        for path in glob.glob(os.path.join(settings.CONTACT_SPOOL_DIR, "contact-*.json")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    due.append((json.load(f).get("next_attempt", 0), path))
+            except (OSError, ValueError):
+                continue  # Sent meanwhile, or being rewritten
+        return due
+
+    # Delivery
+
+    def _connect(self):
+        smtp_class = smtplib.SMTP_SSL if settings.SMTP_SSL else smtplib.SMTP
+        smtp = smtp_class(settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT)
+        if settings.SMTP_AUTH:
+            if not settings.SMTP_SSL:
+                smtp.starttls()
+            smtp.login(settings.SMTP_USER or settings.CONTACT_EMAIL, settings.SMTP_PASSWORD)
+        return smtp
+
+    def _close(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            pass
+        self._smtp = None
+
+    def _send(self, message: dict):
+        msg = _build_message(message)
+        with upstream_timer("smtp", "send_message"):
+            reused = self._smtp is not None
+            try:
+                if self._smtp is None:
+                    self._smtp = self._connect()
+                self._smtp.send_message(msg)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                # Only a dropped connection is retried here; other SMTPExceptions
+                # (also OSErrors) are answers from the server and go to the retry schedule
+                self._close()
+                if not reused:
+                    raise
+                # The kept-open connection was dropped by the server; reconnect once
+                self._smtp = self._connect()
+                self._smtp.send_message(msg)
+            except Exception:
+                self._close()
+                raise
+        self._last_used = time.monotonic()
+
+    def _deliver(self, path: str):
+        '''
+        Try to send one spooled message. Returns when to try again, or None
+        once the file is gone (sent, given up on, or sent by another worker).
+        '''
+        try:
+            f = open(path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        with f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return time.time() + RETRY_BASE_SECONDS  # Another worker is sending it
+            if os.fstat(f.fileno()).st_nlink == 0:
+                return time.time()  # Removed or rewritten while we waited; look again
+            try:
+                message = json.load(f)
+            except ValueError:
+                logger.error(f"[ContactMail] Unreadable spool file {os.path.basename(path)}, moved aside")
+                os.replace(path, path[:-len(".json")] + ".dead")
+                return None
+            if message.get("next_attempt", 0) > time.time():
+                return message["next_attempt"]
+
+            try:
+                self._send(message)
+            except Exception as e:
+                self.failures += 1
+                message["attempts"] = message.get("attempts", 0) + 1
+                if message["attempts"] >= settings.SMTP_MAX_ATTEMPTS:
+                    os.replace(path, path[:-len(".json")] + ".dead")
+                    self.dead += 1
+                    logger.error(f"[ContactMail] Giving up on message from {message['email']} after {message['attempts']} attempts: {e}")
+                    return None
+                delay = min(RETRY_BASE_SECONDS * 2 ** (message["attempts"] - 1), RETRY_MAX_SECONDS)
+                message["next_attempt"] = time.time() + delay
+                self._write_spool(message)
+                logger.warning(f"[ContactMail] Delivery failed (attempt {message['attempts']}), retrying in {delay}s: {e}")
+                return message["next_attempt"]
+
+            os.remove(path)
+        self.sent += 1
+        logger.info(f"[ContactMail] Sent message from {message['email']}")
+        return None
+
+    def _run(self):
+        due = []  # Heap of (next attempt, spool path)
+        scheduled = set()
+        next_scan = 0.0
+        stopping = False
+
+        def schedule(at, path):
+            if path not in scheduled:
+                scheduled.add(path)
+                heapq.heappush(due, (at, path))
+
+        while not stopping:
+            now = time.time()
+            if now >= next_scan:
+                for at, path in self._scan_spool():
+                    schedule(at, path)
+                next_scan = now + SPOOL_RESCAN_SECONDS
+
+            wait = next_scan - now
+            if due:
+                wait = min(wait, due[0][0] - now)
+            if self._smtp is not None:
+                wait = min(wait, self._last_used + settings.SMTP_IDLE_TIMEOUT - time.monotonic())
+            try:
+                item = self._queue.get(timeout=max(wait, 0))
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                stopping = True
+            elif item is not None:
+                schedule(0, item)
+
+            # On stop, still make the first attempt for anything already due
+            while due and due[0][0] <= time.time():
+                _, path = heapq.heappop(due)
+                scheduled.discard(path)
+                try:
+                    retry_at = self._deliver(path)
+                except Exception as e:
+                    logger.error(f"[ContactMail] Worker error on {os.path.basename(path)}: {e}")
+                    retry_at = time.time() + RETRY_BASE_SECONDS
+                if retry_at is not None and not stopping:
+                    schedule(retry_at, path)
+
+            if self._smtp is not None and time.monotonic() - self._last_used >= settings.SMTP_IDLE_TIMEOUT:
+                self._close()
+        self._close()
+
+    # Lifecycle
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            os.makedirs(settings.CONTACT_SPOOL_DIR, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="contact-mail", daemon=True)
+            self._thread.start()
+            logger.info(f"[ContactMail] Delivery worker started ({settings.SMTP_HOST}:{settings.SMTP_PORT})")
+
+    async def send(self, name: str, email: str, message: str):
+        '''
+        Queue a contact-form message for delivery. Returns once it is spooled.
+        '''
+        if not self.enabled:
+            logger.warning("SMTP_PASSWORD not set — contact submission logged only")
+            return
+        record = {
+            "id": uuid.uuid4().hex,
+            "name": name,
+            "email": email,
+            "message": message,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "attempts": 0,
+        }
+        await run_in_threadpool(self._ensure_started)
+        path = await run_in_threadpool(self._write_spool, record)
+        self.queued += 1
+        self._queue.put(path)
+
+    async def start(self):
+        if self.enabled:
+            await run_in_threadpool(self._ensure_started)
+
+    async def stop(self):
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        await run_in_threadpool(self._thread.join, settings.SMTP_TIMEOUT * 2)
+        self._thread = None
+
+    def stats(self):
+        spooled = len(glob.glob(os.path.join(settings.CONTACT_SPOOL_DIR, "contact-*.json"))) if self._thread else 0
+        return {"queued": self.queued, "sent": self.sent, "failures": self.failures, "dead": self.dead, "spooled": spooled}
+
+contact_mailer = ContactMailer()
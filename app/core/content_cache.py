@@ -0,0 +1,86 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from fastapi.concurrency import run_in_threadpool
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+class ContentCache:
+    '''
+    JSON-serialisable values keyed by content hash, held in an in-memory LRU
+    and optionally persisted under `directory` so they survive restarts.
+    '''
+
+    def __init__(self, name: str, maxsize: int = 256, directory: str = None):
+        self.name = name
+        self.directory = os.path.join(directory, name) if directory else None
+        self.memory = TTLCache(maxsize=maxsize, expires=False)
+        self.disk_hits = 0
+        self.bytes_saved = 0
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.json")
+
+    def _read(self, key: str):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"[{self.name} cache] Unreadable entry for {key[:16]}: {e}")
+            return None
+
+    def _write(self, key: str, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    async def get(self, key: str):
+        value = self.memory.get(key)
+        if value is not None or not self.directory:
+            return value
+
+        value = await run_in_threadpool(self._read, key)
+        if value is not None:
+            self.disk_hits += 1
+            self.memory.set(key, value)
+        return value
+
+    async def set(self, key: str, value):
+        self.memory.set(key, value)
+        if not self.directory:
+            return
+        try:
+            await run_in_threadpool(self._write, key, value)
+        except Exception as e:
+            logger.warning(f"[{self.name} cache] Failed to persist entry: {e}")
+
+    def stats(self):
+        stats = self.memory.stats()
+        # A memory miss that was served from disk still counts as a hit
+        hits = stats["hits"] + self.disk_hits
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            **stats,
+            "disk_hits": self.disk_hits,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "persistent": bool(self.directory),
+        }
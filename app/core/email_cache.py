@@ -0,0 +1,200 @@
+import logging
+import re
+import sqlite3
+import time
+import unicodedata
+from datetime import datetime, timezone
+from urllib.parse import unquote
+from fastapi.concurrency import run_in_threadpool
+from .config import settings
+from .metrics import upstream_timer
+
+logger = logging.getLogger(__name__)
+
+# Email-finder results are cached per lookup key:
+#   handle:<linkedin handle>          result of the LinkedIn-handle attempt
+#   name:<full name>|<company>        result of the name + company attempt
+# A found email is stored under every key of the request; a miss only under
+# the key of the attempt that missed. A stored email of None means "Not found".
+
+COMPANY_SUFFIXES = {
+    "inc", "incorporated", "llc", "llp", "lp", "ltd", "limited", "corp",
+    "corporation", "co", "company", "plc", "gmbh", "ag", "sa", "group", "the",
+}
+
+def _ascii_words(value: str) -> list:
+    value = unicodedata.normalize("NFKD", value or "")
+    value = value.encode("ascii", "ignore").decode("ascii").lower()
+    return re.sub(r"[^a-z0-9]+", " ", value).split()
+
+def normalize_name(full_name: str) -> str:
+    return " ".join(_ascii_words(full_name))
+
+def normalize_company(company: str) -> str:
+    '''
+    One key per company however it is written: "Goldman Sachs & Co.",
+    "Goldman Sachs and Company" and "Goldman Sachs" all become "goldman sachs".
+    Punctuation ("&" included) is dropped first, then the connective "and"
+    and legal suffixes, so no spelling leaves a stray word behind.
+    '''
+    words = [w for w in _ascii_words(company) if w != "and" and w not in COMPANY_SUFFIXES]
+    return " ".join(words)
+
+def handle_key(handle: str):
+    handle = unquote(handle or "").strip().lower()
+    return f"handle:{handle}" if handle else None
+
+def name_key(full_name: str, company: str):
+    name, org = normalize_name(full_name), normalize_company(company)
+    return f"name:{name}|{org}" if name and org else None
+
+
+class SQLiteLookupStore:
+    '''
+    Lookup cache in a local SQLite file (WAL mode), shared by every worker on the host.
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS email_lookup_cache ("
+                "key TEXT PRIMARY KEY, email TEXT, expires_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS email_patterns ("
+                "company TEXT NOT NULL, domain TEXT NOT NULL, pattern TEXT NOT NULL, "
+                "hits INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL, "
+                "PRIMARY KEY (company, domain, pattern))"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get_many(self, keys: list) -> dict:
+        placeholders = ",".join("?" for _ in keys)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT key, email FROM email_lookup_cache WHERE key IN ({placeholders}) AND expires_at > ?",
+                [*keys, time.time()]
+            ).fetchall()
+        return {key: email for key, email in rows}
+
+    def put_many(self, keys: list, email, ttl: int):
+        expires_at = time.time() + ttl
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO email_lookup_cache (key, email, expires_at) VALUES (?, ?, ?)",
+                [(key, email, expires_at) for key in keys]
+            )
+
+    def get_patterns(self, company: str) -> list:
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT domain, pattern, hits FROM email_patterns WHERE company = ?", (company,)
+            ).fetchall()
+
+    def record_pattern(self, company: str, domain: str, pattern: str):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO email_patterns (company, domain, pattern, hits, updated_at) VALUES (?, ?, ?, 1, ?) "
+                "ON CONFLICT (company, domain, pattern) DO UPDATE SET hits = hits + 1, updated_at = excluded.updated_at",
+                (company, domain, pattern, time.time())
+            )
+
+
+class SupabaseLookupStore:
+    '''
+    Lookup cache in the Postgres table `email_lookup_cache` (see supabase_schema.sql).
+    '''
+
+    def __init__(self, get_client):
+        # A getter, so the Supabase SDK is only imported once the cache is used
+        self.get_client = get_client
+
+    def get_many(self, keys: list) -> dict:
+        now = datetime.now(timezone.utc).isoformat()
+        with upstream_timer("supabase", "email_lookup_cache.select"):
+            res = self.get_client().table("email_lookup_cache") \
+                .select("key, email") \
+                .in_("key", keys) \
+                .gt("expires_at", now) \
+                .execute()
+        return {row["key"]: row["email"] for row in res.data or []}
+
+    def put_many(self, keys: list, email, ttl: int):
+        expires_at = datetime.fromtimestamp(time.time() + ttl, timezone.utc).isoformat()
+        with upstream_timer("supabase", "email_lookup_cache.upsert"):
+            self.get_client().table("email_lookup_cache").upsert(
+                [{"key": key, "email": email, "expires_at": expires_at} for key in keys]
+            ).execute()
+
+    def get_patterns(self, company: str) -> list:
+        with upstream_timer("supabase", "email_patterns.select"):
+            res = self.get_client().table("email_patterns") \
+                .select("domain, pattern, hits") \
+                .eq("company", company) \
+                .execute()
+        return [(row["domain"], row["pattern"], row["hits"]) for row in res.data or []]
+
+    def record_pattern(self, company: str, domain: str, pattern: str):
+        # An RPC so concurrent workers increment atomically
+        with upstream_timer("supabase", "record_email_pattern"):
+            self.get_client().rpc(
+                "record_email_pattern", {"p_company": company, "p_domain": domain, "p_pattern": pattern}
+            ).execute()
+
+
+class EmailLookupCache:
+    def __init__(self, store=None):
+        self.store = store
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    async def get(self, keys: list) -> dict:
+        '''
+        Cached results for the given keys (missing keys are absent from the result).
+        Cache errors are logged and treated as misses.
+        '''
+        keys = [k for k in keys if k]
+        found = {}
+        if self.store and keys:
+            try:
+                found = await run_in_threadpool(self.store.get_many, keys)
+            except Exception as e:
+                logger.warning(f"[EmailCache] Lookup failed: {e}")
+
+        if any(found.values()):
+            self.hits += 1
+        elif found and len(found) == len(keys):
+            self.negative_hits += 1
+        else:
+            self.misses += 1
+        return found
+
+    async def put(self, keys: list, email):
+        keys = [k for k in keys if k]
+        if not self.store or not keys:
+            return
+        ttl = settings.EMAIL_CACHE_TTL if email else settings.EMAIL_CACHE_NEGATIVE_TTL
+        try:
+            await run_in_threadpool(self.store.put_many, keys, email, ttl)
+        except Exception as e:
+            logger.warning(f"[EmailCache] Store failed: {e}")
+
+    def stats(self):
+        return {"backend": settings.EMAIL_CACHE_BACKEND, "hits": self.hits, "negative_hits": self.negative_hits, "misses": self.misses}
+
+
+def create_email_cache(get_supabase=None) -> EmailLookupCache:
+    backend = settings.EMAIL_CACHE_BACKEND.lower()
+    try:
+        if backend == "sqlite":
+            return EmailLookupCache(SQLiteLookupStore(settings.EMAIL_CACHE_PATH))
+        if backend == "supabase" and get_supabase:
+            return EmailLookupCache(SupabaseLookupStore(get_supabase))
+    except Exception as e:
+        logger.error(f"[EmailCache] Failed to open {backend} backend, caching disabled: {e}")
+    return EmailLookupCache()
@@ -0,0 +1,154 @@
+import logging
+from fastapi.concurrency import run_in_threadpool
+from .cache import TTLCache
+from .config import settings
+from .email_cache import normalize_company, normalize_name
+
+logger = logging.getLogger(__name__)
+
+# Local-part templates, by pattern name
+PATTERNS = {
+    "first.last": "{first}.{last}",
+    "firstlast": "{first}{last}",
+    "first_last": "{first}_{last}",
+    "first-last": "{first}-{last}",
+    "flast": "{f}{last}",
+    "f.last": "{f}.{last}",
+    "firstl": "{first}{l}",
+    "first.l": "{first}.{l}",
+    "first": "{first}",
+    "last.first": "{last}.{first}",
+    "lastfirst": "{last}{first}",
+    "lastf": "{last}{f}",
+    "last": "{last}",
+}
+
+# Generational suffixes may or may not be part of someone's address
+GENERATIONAL_SUFFIXES = {"jr", "sr", "ii", "iii", "iv"}
+# Credentials never are
+CREDENTIALS = {"phd", "md", "mba", "cfa", "cpa"}
+
+def split_name(full_name: str):
+    '''
+    (first, last) for a plain "First Last" name, ignoring middle initials and
+    credentials; None for any other shape. Hyphenated ("Smith-Jones"),
+    multi-part ("van der Berg", "O'Brien") and suffixed ("Jr.") names have no
+    single reading as a local part, so no pattern is applied to them.
+    '''
+    words = []
+    for part in (full_name or "").split():
+        word = normalize_name(part)
+        if word in GENERATIONAL_SUFFIXES or (word and not word.isalpha()):
+            return None
+        if len(word) > 1 and word not in CREDENTIALS:
+            words.append(word)
+    if len(words) != 2:
+        return None
+    return words[0], words[1]
+
+def render(pattern: str, first: str, last: str) -> str:
+    return PATTERNS[pattern].format(first=first, last=last, f=first[0], l=last[0])
+
+def detect_pattern(full_name: str, email: str):
+    '''
+    (domain, pattern) of an email address found for full_name, or None when
+    the name does not split cleanly or the address fits no pattern, or more
+    than one.
+    '''
+    names = split_name(full_name)
+    local, _, domain = (email or "").lower().rpartition("@")
+    if not names or not local or not domain:
+        return None
+    matches = [p for p in PATTERNS if render(p, *names) == local]
+    if len(matches) != 1:
+        return None
+    return domain, matches[0]
+
+class PatternIndex:
+    '''
+    company -> (domain, pattern) statistics learned from Hunter results,
+    kept in the email cache's store and cached in memory per company.
+
+    A company's best (domain, pattern) is trusted once it has been seen at
+    least EMAIL_PATTERN_MIN_SAMPLES times and its confidence, hits / (total + 1),
+    reaches EMAIL_PATTERN_MIN_CONFIDENCE. The +1 keeps a handful of
+    agreeing samples from looking certain.
+    '''
+
+    def __init__(self, store=None):
+        self.store = store
+        self._stats = TTLCache(maxsize=5000, ttl=settings.EMAIL_PATTERN_CACHE_TTL)
+        self.learned = 0
+        self.predictions = 0
+        self.low_confidence = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.EMAIL_PATTERNS and self.store is not None
+
+    async def _company_stats(self, company: str) -> list:
+        stats = self._stats.get(company)
+        if stats is None:
+            try:
+                stats = await run_in_threadpool(self.store.get_patterns, company)
+            except Exception as e:
+                logger.warning(f"[EmailPatterns] Lookup failed: {e}")
+                return []
+            self._stats.set(company, stats)
+        return stats
+
+    async def best(self, company: str):
+        '''
+        (domain, pattern, confidence, samples) for a normalized company name,
+        or None when nothing has been learned for it.
+        '''
+        stats = await self._company_stats(company)
+        if not stats:
+            return None
+        total = sum(hits for _, _, hits in stats)
+        domain, pattern, hits = max(stats, key=lambda row: row[2])
+        return domain, pattern, round(hits / (total + 1), 3), total
+
+    async def predict(self, full_name: str, company: str):
+        '''
+        (email, confidence) from the company's learned pattern, or None when
+        the pattern is not trusted yet and Hunter should be asked instead.
+        '''
+        if not self.enabled:
+            return None
+        names = split_name(full_name)
+        org = normalize_company(company)
+        if not names or not org:
+            return None
+        best = await self.best(org)
+        if best is None:
+            return None
+        domain, pattern, confidence, samples = best
+        if samples < settings.EMAIL_PATTERN_MIN_SAMPLES or confidence < settings.EMAIL_PATTERN_MIN_CONFIDENCE:
+            self.low_confidence += 1
+            return None
+        self.predictions += 1
+        return f"{render(pattern, *names)}@{domain}", confidence
+
+    async def learn(self, full_name: str, company: str, email: str):
+        '''
+        Record the pattern of an email Hunter found for full_name at company.
+        '''
+        if not self.enabled:
+            return
+        org = normalize_company(company)
+        detected = detect_pattern(full_name, email)
+        if not org or not detected:
+            return
+        domain, pattern = detected
+        try:
+            await run_in_threadpool(self.store.record_pattern, org, domain, pattern)
+        except Exception as e:
+            logger.warning(f"[EmailPatterns] Store failed: {e}")
+            return
+        self.learned += 1
+        # Next lookup for this company reads the updated counts
+        self._stats.pop(org)
+
+    def stats(self):
+        return {"learned": self.learned, "predictions": self.predictions, "low_confidence": self.low_confidence, "companies": len(self._stats)}
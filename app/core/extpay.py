@@ -0,0 +1,92 @@
+import asyncio
+import hashlib
+import logging
+import time
+from .cache import TTLCache, SingleFlight
+from .clients import upstream_get
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Tier per ExtPay key (hashed), stored as (tier, fetched_at).
+# Entries younger than TIER_FRESH_TTL are served as-is; older ones are served
+# immediately while a background refresh runs (stale-while-revalidate), until
+# TIER_STALE_TTL evicts them.
+_tier_cache = TTLCache(maxsize=settings.TIER_CACHE_SIZE, ttl=settings.TIER_STALE_TTL)
+_tier_flight = SingleFlight()
+_background_refreshes = set()
+# After a failed refresh, wait this long before asking ExtensionPay again
+REFRESH_RETRY_DELAY = 30
+
+def _key(extpay_key: str) -> str:
+    return hashlib.sha256(extpay_key.encode("utf-8")).hexdigest()
+
+async def _fetch_tier(extpay_key: str):
+    '''
+    Ask ExtensionPay for the user's status. Returns "pro"/"free", or None if
+    ExtensionPay could not give an answer (timeout, 5xx).
+    '''
+    # ID is 'sendyai' as confirmed by user
+    logger.info(f"[Usage] Verifying ExtensionPay key: {extpay_key[:8]}...")
+    response = await upstream_get(
+        "extpay",
+        "/extension/sendyai/api/v2/user",
+        params={"api_key": extpay_key}
+    )
+    if response.is_success:
+        data = response.json()
+        logger.info(f"[Usage] ExtPay Success. User Paid: {data.get('paidAt') is not None}")
+        return "pro" if data.get("paidAt") else "free"
+
+    logger.warning(f"[Usage] ExtensionPay verification failed: {response.status_code}")
+    if response.status_code >= 500:
+        return None
+    # ExtensionPay rejected the key outright
+    return "free"
+
+async def _refresh_tier(key: str, extpay_key: str):
+    try:
+        tier = await _fetch_tier(extpay_key)
+    except Exception as e:
+        logger.error(f"Error calling ExtensionPay API: {e}")
+        tier = None
+
+    if tier is not None:
+        _tier_cache.set(key, (tier, time.monotonic()))
+        return tier
+
+    # ExtensionPay is slow or down: keep the last known tier rather than dropping to free
+    entry = _tier_cache.get(key)
+    if entry:
+        logger.warning(f"[Usage] ExtensionPay unavailable, using last known tier: {entry[0]}")
+        # Treat it as fetched just long enough ago to be refreshed again after the retry delay
+        _tier_cache.set(key, (entry[0], time.monotonic() - settings.TIER_FRESH_TTL + REFRESH_RETRY_DELAY))
+        return entry[0]
+    return None
+
+def _refresh_in_background(key: str, extpay_key: str):
+    task = asyncio.ensure_future(_tier_flight.do(key, _refresh_tier, key, extpay_key))
+    _background_refreshes.add(task)
+    task.add_done_callback(_background_refreshes.discard)
+
+async def get_user_tier(extpay_key: str = None) -> str:
+    '''
+    The user's tier ("free" or "pro"), from the cache when possible.
+    Concurrent refreshes for the same key share one ExtensionPay call.
+    '''
+    if not extpay_key:
+        return "free"
+
+    key = _key(extpay_key)
+    entry = _tier_cache.get(key)
+    if entry:
+        tier, fetched_at = entry
+        if time.monotonic() - fetched_at > settings.TIER_FRESH_TTL:
+            _refresh_in_background(key, extpay_key)
+        return tier
+
+    tier = await _tier_flight.do(key, _refresh_tier, key, extpay_key)
+    return tier or "free"
+
+def get_tier_cache_stats():
+    return {**_tier_cache.stats(), "shared_refreshes": _tier_flight.shared}
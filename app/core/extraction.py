@@ -0,0 +1,123 @@
+import asyncio
+import io
+import logging
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi.concurrency import run_in_threadpool
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Bump when extraction output changes so cached text is not reused
+EXTRACTOR_VERSION = "1"
+
+# Resume text extraction runs off the event loop on a bounded process pool.
+# Workers receive the raw upload bytes, so nothing touches the filesystem.
+_pool: ProcessPoolExecutor = None
+_pool_unavailable = False
+
+# pdfplumber and python-docx are imported on first use: they are slow to import
+# and only /onboarding/parse needs them.
+
+def _pdf_page_count(data: bytes) -> int:
+    import pdfplumber
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        return len(pdf.pages)
+
+def _pdf_pages_text(data: bytes, start: int, stop: int) -> list:
+    import pdfplumber
+    with pdfplumber.open(io.BytesIO(data), pages=list(range(start + 1, stop + 1))) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages]
+
+def _docx_text(data: bytes) -> str:
+    from docx import Document
+    doc = Document(io.BytesIO(data))
+    return "\n".join(p.text for p in doc.paragraphs)
+
+def get_extraction_pool():
+    global _pool, _pool_unavailable
+    if _pool is None and settings.RESUME_PARSE_WORKERS > 0 and not _pool_unavailable:
+        try:
+            # spawn: forking a process that runs an event loop and threads is unsafe
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.RESUME_PARSE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        except Exception as e:
+            _disable_pool(e)
+            return None
+        logger.info(f"Extraction pool started with {settings.RESUME_PARSE_WORKERS} workers")
+    return _pool
+
+def _disable_pool(error: Exception):
+    # e.g. no /dev/shm (AWS Lambda, Vercel), so multiprocessing queues and
+    # semaphores cannot be created; extraction runs on threads from now on
+    global _pool_unavailable
+    _pool_unavailable = True
+    shutdown_extraction_pool()
+    logger.error(f"Extraction pool unavailable, extracting on threads instead: {error}")
+
+def shutdown_extraction_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+async def _run(fn, *args):
+    for attempt in range(2):
+        pool = get_extraction_pool()
+        if pool is None:
+            return await run_in_threadpool(fn, *args)
+        try:
+            # Submitting starts the worker processes, so failures to spawn show up here
+            future = pool.submit(fn, *args)
+        except BrokenProcessPool:
+            pass
+        except OSError as e:
+            _disable_pool(e)
+            continue
+        else:
+            try:
+                return await asyncio.wrap_future(future)
+            except BrokenProcessPool:
+                pass
+        # A crashed worker poisons the pool; retry once on a fresh one
+        logger.error(f"Extraction pool broken, {'giving up' if attempt else 'retrying on a fresh pool'}")
+        if _pool is pool:
+            shutdown_extraction_pool()
+    raise BrokenProcessPool("Extraction pool broke twice")
+
+async def extract_text_from_pdf(data: bytes) -> str:
+    '''
+    Extract text from the first RESUME_MAX_PAGES pages, split across workers
+    in chunks of at least RESUME_PAGES_PER_TASK pages.
+    '''
+    try:
+        page_count = await _run(_pdf_page_count, data)
+        if page_count > settings.RESUME_MAX_PAGES:
+            logger.info(f"PDF has {page_count} pages, extracting the first {settings.RESUME_MAX_PAGES}")
+            page_count = settings.RESUME_MAX_PAGES
+
+        workers = max(1, settings.RESUME_PARSE_WORKERS)
+        chunk = max(settings.RESUME_PAGES_PER_TASK, math.ceil(page_count / workers))
+        parts = await asyncio.gather(*[
+            _run(_pdf_pages_text, data, start, min(start + chunk, page_count))
+            for start in range(0, page_count, chunk)
+        ])
+        return "\n".join(text for part in parts for text in part if text)
+    except BrokenProcessPool:
+        raise  # Not the file's fault; do not report it as unreadable
+    except Exception as e:
+        logger.error(f"Error extracting PDF text: {e}")
+        return ""
+
+async def extract_text_from_docx(data: bytes) -> str:
+    try:
+        return await _run(_docx_text, data)
+    except BrokenProcessPool:
+        raise  # Not the file's fault; do not report it as unreadable
+    except Exception as e:
+        logger.error(f"Error extracting DOCX text: {e}")
+        return ""
@@ -0,0 +1,68 @@
+import json
+import logging
+import time
+from jwt.algorithms import RSAAlgorithm
+from .cache import SingleFlight
+from .clients import upstream_get
+
+logger = logging.getLogger(__name__)
+
+class JWKSCache:
+    '''
+    Public signing keys from a JWKS endpoint, keyed by "kid".
+    Keys are refreshed every `refresh_interval` seconds, or early when a token
+    names an unknown kid (rate limited to one fetch per `min_refresh_interval`).
+    '''
+
+    def __init__(self, url: str, refresh_interval: float = 3600, min_refresh_interval: float = 60):
+        self.url = url
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self._keys = {}
+        self._fetched_at = None
+        self._flight = SingleFlight()
+
+    async def _fetch(self):
+        res = await upstream_get("google", self.url)
+        res.raise_for_status()
+        keys = {}
+        for jwk in res.json().get("keys", []):
+            if jwk.get("kty") != "RSA" or not jwk.get("kid"):
+                continue
+            keys[jwk["kid"]] = RSAAlgorithm.from_jwk(json.dumps(jwk))
+        return keys
+
+    async def _refresh(self):
+        try:
+            keys = await self._fetch()
+        except Exception as e:
+            # Keep serving the previous key set if Google is unreachable
+            logger.error(f"JWKS refresh from {self.url} failed: {e}")
+            if self._fetched_at is None:
+                raise
+            # Retry after the short interval rather than a full refresh period
+            self._fetched_at = time.monotonic() - self.refresh_interval + self.min_refresh_interval
+            return
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+        logger.info(f"Loaded {len(keys)} signing keys from {self.url}")
+
+    async def refresh(self):
+        await self._flight.do("refresh", self._refresh)
+
+    def _age(self):
+        if self._fetched_at is None:
+            return None
+        return time.monotonic() - self._fetched_at
+
+    async def get_key(self, kid: str):
+        age = self._age()
+        if age is None or age > self.refresh_interval:
+            await self.refresh()
+
+        key = self._keys.get(kid)
+        if key is None and self._age() > self.min_refresh_interval:
+            # Keys may have rotated since the last fetch
+            await self.refresh()
+            key = self._keys.get(kid)
+        return key
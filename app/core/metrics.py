@@ -0,0 +1,245 @@
+import contextvars
+import threading
+import time
+from .config import settings
+from .startup import record_request as record_first_request
+
+# Latency buckets in seconds, from a cache hit up to a slow Claude generation
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = []
+_stats_sources = {}
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                # Per-bucket (non-cumulative) counts, sum, count
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self._values.items())
+        lines = self._header()
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+# Upstream calls (Google, ExtensionPay, Hunter, Anthropic, Supabase)
+UPSTREAM_LATENCY = Histogram("sendy_upstream_request_duration_seconds", "Upstream call latency.", ("upstream", "operation"))
+UPSTREAM_ERRORS = Counter("sendy_upstream_errors_total", "Upstream calls that raised or returned a 5xx.", ("upstream", "operation"))
+UPSTREAM_IN_FLIGHT = Gauge("sendy_upstream_in_flight", "Upstream calls currently running.", ("upstream",))
+
+# Routes
+HTTP_LATENCY = Histogram("sendy_http_request_duration_seconds", "Request latency until the response is fully sent.", ("method", "route"))
+HTTP_REQUESTS = Counter("sendy_http_requests_total", "Requests served.", ("method", "route", "status"))
+HTTP_IN_FLIGHT = Gauge("sendy_http_requests_in_flight", "Requests currently being served, by router prefix.", ("group",))
+
+# Upstream time spent on behalf of the current request, for Server-Timing
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+class upstream_timer:
+    '''
+    Times one upstream call; use as `with` or `async with`. Exceptions count
+    as errors; call fail() for error responses that do not raise.
+    '''
+
+    def __init__(self, upstream: str, operation: str):
+        self.upstream = upstream
+        self.operation = operation
+        self.failed = False
+
+    def fail(self):
+        self.failed = True
+
+    def __enter__(self):
+        UPSTREAM_IN_FLIGHT.inc(self.upstream)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        UPSTREAM_IN_FLIGHT.dec(self.upstream)
+        UPSTREAM_LATENCY.observe(elapsed, self.upstream, self.operation)
+        if exc_type is not None or self.failed:
+            UPSTREAM_ERRORS.inc(self.upstream, self.operation)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((self.upstream, elapsed))
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+def register_stats(source: str, fn):
+    '''
+    Expose a stats() dict (cache sizes, hit ratios, ...) on /metrics as
+    sendy_component_stat{source=..., stat=...}.
+    '''
+    _stats_sources[source] = fn
+
+def _stats_lines() -> list:
+    lines = [
+        "# HELP sendy_component_stat Internal cache and queue statistics.",
+        "# TYPE sendy_component_stat gauge",
+    ]
+    for source, fn in sorted(_stats_sources.items()):
+        try:
+            stats = fn()
+        except Exception:
+            continue
+        flat = {}
+        for key, value in stats.items():
+            if isinstance(value, dict):
+                # e.g. prompt cache totals, one dict per prompt
+                flat.update({f"{key}_{k}": v for k, v in value.items()})
+            else:
+                flat[key] = value
+        for key, value in sorted(flat.items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"sendy_component_stat{_labels(('source', 'stat'), (source, key))} {_number(value)}")
+    return lines
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    lines.extend(_stats_lines())
+    return "\n".join(lines) + "\n"
+
+# Router prefixes used as the in-flight label; the route template is only
+# known once routing has happened
+ROUTE_GROUPS = ("api", "onboarding", "outreach", "user", "usage", "static")
+
+def _route_group(path: str) -> str:
+    segment = path.split("/", 2)[1] if path.startswith("/") else ""
+    return segment if segment in ROUTE_GROUPS else "other"
+
+class MetricsMiddleware:
+    '''
+    Records latency and status per route template (e.g. /outreach/batch/{batch_id})
+    and, with SERVER_TIMING, adds a Server-Timing header listing upstream time
+    spent before the response started.
+    '''
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        group = _route_group(scope["path"])
+        timings = []
+        token = _request_timings.set(timings)
+        status = {"code": 500}
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if settings.SERVER_TIMING:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", _server_timing(timings, time.perf_counter() - started).encode("latin-1"))
+                    ]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(group)
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            HTTP_IN_FLIGHT.dec(group)
+            _request_timings.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                label = route.path
+            elif scope.get("root_path"):
+                label = scope["root_path"]  # Mounted app, e.g. /static
+            else:
+                label = "unmatched"
+            elapsed = time.perf_counter() - started
+            HTTP_LATENCY.observe(elapsed, scope["method"], label)
+            HTTP_REQUESTS.inc(scope["method"], label, str(status["code"]))
+            record_first_request(f"{scope['method']} {label}", elapsed)
+
+def _server_timing(timings: list, elapsed: float) -> str:
+    totals = {}
+    for upstream, seconds in list(timings):
+        total, count = totals.get(upstream, (0.0, 0))
+        totals[upstream] = (total + seconds, count + 1)
+    entries = [f'{name};dur={total * 1000:.1f};desc="{count} call(s)"' for name, (total, count) in sorted(totals.items())]
+    entries.append(f"app;dur={elapsed * 1000:.1f}")
+    return ", ".join(entries)
@@ -0,0 +1,56 @@
+import hashlib
+import logging
+from .cache import TTLCache
+from .clients import get_supabase
+from .config import settings
+from .metrics import upstream_timer
+
+logger = logging.getLogger(__name__)
+
+PROFILE_COLUMNS = (
+    "id", "name", "email", "university", "degree", "experiences",
+    "skills", "total_exp", "raw_summary", "updated_at",
+)
+
+# Read-through cache of profile rows: user_id -> {"version", "data"}.
+# "version" is the row's updated_at; "data" holds whichever columns have been
+# fetched for that version. save_profile invalidates the entry, and the TTL
+# bounds staleness for writes made through other workers.
+_profile_cache = TTLCache(maxsize=settings.PROFILE_CACHE_SIZE, ttl=settings.PROFILE_CACHE_TTL)
+
+def get_profile(user_id: str, columns=PROFILE_COLUMNS):
+    '''
+    Profile columns for user_id (always including updated_at), or None if the
+    user has no profile. Only columns missing from the cache are fetched.
+    '''
+    columns = set(columns) | {"updated_at"}
+    entry = _profile_cache.get(user_id)
+    if entry and columns <= entry["data"].keys():
+        return {c: entry["data"][c] for c in columns}
+
+    with upstream_timer("supabase", "profiles.select"):
+        result = get_supabase().table("profiles") \
+            .select(",".join(sorted(columns))) \
+            .eq("id", user_id) \
+            .limit(1) \
+            .execute()
+    if not result.data:
+        return None
+
+    row = result.data[0]
+    version = row.get("updated_at")
+    if entry and entry["version"] == version:
+        # Same version: widen the cached row with the newly fetched columns
+        row = {**entry["data"], **row}
+    _profile_cache.set(user_id, {"version": version, "data": row})
+    return {c: row.get(c) for c in columns}
+
+def invalidate_profile(user_id: str):
+    _profile_cache.pop(user_id)
+
+def profile_etag(user_id: str, version: str) -> str:
+    digest = hashlib.sha256(f"{user_id}:{version}".encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+def get_profile_cache_stats():
+    return _profile_cache.stats()
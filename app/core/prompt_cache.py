@@ -0,0 +1,52 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Anthropic ignores cache_control on prefixes shorter than this many tokens
+# (Sonnet and Opus; Haiku needs 2048), so short prompts are sent uncached
+MIN_CACHEABLE_TOKENS = 1024
+
+# Running Anthropic token totals per prompt, including prompt-cache reads/writes
+_totals = {}
+_below_minimum = set()
+
+def cached_system(text: str) -> list:
+    '''
+    System prompt as a single text block marked as a cacheable prefix.
+    '''
+    return [{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}]
+
+def record_usage(prompt: str, usage, cached_prefix: bool = False) -> dict:
+    '''
+    Log and accumulate token usage (incl. cache read/write) for one Messages API call.
+    With cached_prefix, a call that neither wrote nor read the cache is counted
+    as uncached: the prefix was too short for caching to apply.
+    '''
+    counts = {
+        "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+        "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+        "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", 0) or 0,
+        "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", 0) or 0,
+    }
+    logger.info(
+        f"[PromptCache] {prompt}: input={counts['input_tokens']} output={counts['output_tokens']} "
+        f"cache_read={counts['cache_read_input_tokens']} cache_write={counts['cache_creation_input_tokens']}"
+    )
+
+    totals = _totals.setdefault(prompt, {"requests": 0, **{k: 0 for k in counts}})
+    totals["requests"] += 1
+    for k, v in counts.items():
+        totals[k] += v
+
+    if cached_prefix and not counts["cache_read_input_tokens"] and not counts["cache_creation_input_tokens"]:
+        totals["uncached_requests"] = totals.get("uncached_requests", 0) + 1
+        if prompt not in _below_minimum:
+            _below_minimum.add(prompt)
+            logger.warning(
+                f"[PromptCache] {prompt}: cacheable prefix was neither written nor read; "
+                f"it is probably shorter than the model's minimum ({MIN_CACHEABLE_TOKENS} tokens)"
+            )
+    return counts
+
+def get_prompt_cache_stats():
+    return {prompt: dict(totals) for prompt, totals in _totals.items()}
@@ -0,0 +1,173 @@
+import json
+import logging
+import queue
+import random
+import re
+import time
+from logging.handlers import QueueHandler, QueueListener
+from urllib.parse import parse_qsl, urlencode
+from .config import settings
+
+logger = logging.getLogger("app.requests")
+
+# Body bytes logged per route prefix; anything else gets LOG_BODY_MAX_BYTES.
+# Resume uploads are large binary files and are never logged.
+ROUTE_BODY_CAPS = {
+    "/onboarding/parse": 0,
+}
+BODY_METHODS = ("POST", "PUT", "PATCH")
+
+# Header, query and JSON field names whose values never reach the logs
+REDACTED_FIELDS = ("api_key", "apikey", "x-extpay-key", "x_extpay_key", "authorization", "password", "token", "access_token")
+_FIELD_PATTERN = "|".join(re.escape(f) for f in REDACTED_FIELDS)
+_JSON_SECRET = re.compile(rf'("(?:{_FIELD_PATTERN})"\s*:\s*)"(?:[^"\\]|\\.)*"?', re.IGNORECASE)
+REDACTED = "[REDACTED]"
+
+def redact_body(text: str) -> str:
+    # Works on truncated JSON too, since the body may be cut at the cap
+    return _JSON_SECRET.sub(rf'\1"{REDACTED}"', text)
+
+def redact_query(query: str) -> str:
+    pairs = parse_qsl(query, keep_blank_values=True)
+    return urlencode([(k, REDACTED if k.lower() in REDACTED_FIELDS else v) for k, v in pairs], safe="[]")
+
+class _RequestLogLine:
+    '''
+    One request's log record. Redaction and JSON encoding happen in __str__,
+    i.e. when the queue listener thread formats it, not on the request path.
+    '''
+
+    def __init__(self, fields: dict, body: bytes = None, body_truncated: bool = False):
+        self.fields = fields
+        self.body = body
+        self.body_truncated = body_truncated
+
+    def __str__(self):
+        fields = dict(self.fields)
+        if fields.get("query"):
+            fields["query"] = redact_query(fields["query"])
+        if self.body is not None:
+            try:
+                fields["body"] = redact_body(self.body.decode("utf-8"))
+            except UnicodeDecodeError:
+                fields["body"] = "<binary data>"
+            if self.body_truncated:
+                fields["body_truncated"] = True
+        return f"[Request] {json.dumps(fields, default=str)}"
+
+class RequestLoggingMiddleware:
+    '''
+    Pure ASGI request logger. Request bodies are copied as they stream through
+    to the app (up to the route's cap, for a sampled share of requests) rather
+    than read up front, and one structured line with status, timing and sizes
+    is logged when the response finishes.
+    '''
+
+    def __init__(self, app):
+        self.app = app
+
+    def _body_cap(self, method: str, path: str) -> int:
+        if method not in BODY_METHODS or random.random() >= settings.LOG_BODY_SAMPLE_RATE:
+            return 0
+        for prefix, cap in ROUTE_BODY_CAPS.items():
+            if path.startswith(prefix):
+                return cap
+        return settings.LOG_BODY_MAX_BYTES
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        method = scope["method"]
+        path = scope["path"]
+        headers = dict(scope.get("headers") or [])
+        cap = self._body_cap(method, path)
+        captured = bytearray()
+        state = {"status": None, "ttfb": None, "request_bytes": 0, "response_bytes": 0, "truncated": False}
+
+        async def logged_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                state["request_bytes"] += len(chunk)
+                room = cap - len(captured)
+                if room > 0:
+                    captured.extend(chunk[:room])
+                if len(chunk) > max(room, 0) and cap:
+                    state["truncated"] = True
+            return message
+
+        async def logged_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                state["ttfb"] = time.perf_counter() - started
+            elif message["type"] == "http.response.body":
+                state["response_bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, logged_receive, logged_send)
+        except Exception:
+            if state["status"] is None:
+                state["status"] = 500
+            raise
+        finally:
+            fields = {
+                "method": method,
+                "path": path,
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "status": state["status"],
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                "ttfb_ms": round(state["ttfb"] * 1000, 1) if state["ttfb"] is not None else None,
+                "request_bytes": state["request_bytes"],
+                "response_bytes": state["response_bytes"],
+                "auth": b"authorization" in headers,
+                "extpay_key": b"x-extpay-key" in headers,
+            }
+            body = bytes(captured) if cap and state["request_bytes"] else None
+            logger.info(_RequestLogLine(fields, body, state["truncated"]))
+
+class _DeferredQueueHandler(QueueHandler):
+    # The queue never leaves the process, so records are queued unformatted and
+    # the listener thread does all formatting
+    def prepare(self, record):
+        return record
+
+_listener = None
+_replaced_handlers = []
+
+def start_log_queue():
+    '''
+    Move the root logger's handlers behind a queue, so log calls on the event
+    loop only enqueue the record and a background thread does the I/O.
+    '''
+    global _listener, _replaced_handlers
+    if _listener is not None or not settings.LOG_QUEUE:
+        return
+    root = logging.getLogger()
+    _replaced_handlers = list(root.handlers)
+    log_queue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, *_replaced_handlers, respect_handler_level=True)
+    for handler in _replaced_handlers:
+        root.removeHandler(handler)
+    root.addHandler(_DeferredQueueHandler(log_queue))
+    _listener.start()
+
+def stop_log_queue():
+    '''
+    Flush queued records and put the original handlers back.
+    '''
+    global _listener, _replaced_handlers
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, _DeferredQueueHandler):
+            root.removeHandler(handler)
+    _listener.stop()
+    for handler in _replaced_handlers:
+        root.addHandler(handler)
+    _listener = None
+    _replaced_handlers = []
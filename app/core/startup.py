@@ -0,0 +1,60 @@
+import logging
+import time
+
+# Imported first by app.main, so this approximates when the app started loading.
+# Kept free of heavy imports on purpose.
+IMPORT_STARTED = time.perf_counter()
+
+logger = logging.getLogger(__name__)
+
+_marks = {}
+_lazy_loads = {}
+_first_requests = {}
+
+def _ms_since_start() -> float:
+    return round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)
+
+def mark(name: str):
+    '''
+    Record a startup milestone (ms since the app started importing).
+    '''
+    _marks[name] = _ms_since_start()
+    logger.info(f"[Startup] {name} at {_marks[name]} ms")
+
+class timed_load:
+    '''
+    Times the first load of a lazily imported dependency or client:
+
+        with timed_load("anthropic"):
+            from anthropic import AsyncAnthropic
+    '''
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None and self.name not in _lazy_loads:
+            _lazy_loads[self.name] = round((time.perf_counter() - self.started) * 1000, 1)
+            logger.info(f"[Startup] Loaded {self.name} on first use in {_lazy_loads[self.name]} ms")
+        return False
+
+def record_request(route: str, seconds: float):
+    '''
+    Remember the latency of the first request to each route; that is the one
+    that pays for lazy loading.
+    '''
+    if route in _first_requests:
+        return
+    _first_requests[route] = round(seconds * 1000, 1)
+    logger.info(f"[Startup] First {route} took {_first_requests[route]} ms ({_ms_since_start()} ms after start)")
+
+def get_startup_stats():
+    return {
+        **_marks,
+        **{f"load {name}": ms for name, ms in _lazy_loads.items()},
+        **{f"first {route}": ms for route, ms in _first_requests.items()},
+    }
@@ -0,0 +1,211 @@
+import asyncio
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import threading
+from fastapi.concurrency import run_in_threadpool
+from starlette.responses import Response
+from .config import settings
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Types worth compressing; images other than SVG are already compressed
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+# Preferred order when the client accepts several encodings
+ENCODINGS = ("br", "gzip")
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Brotli at quality 11 takes seconds for the larger scripts, so assets are
+# loaded with a fast setting and upgraded in a background thread
+STARTUP_BROTLI_QUALITY = 5
+MAX_BROTLI_QUALITY = 11
+
+# /static/... references in HTML attributes, rewritten to fingerprinted URLs
+_STATIC_REF = re.compile(r'((?:src|href)=")/static/([^"?#]+)(")')
+
+class StaticAsset:
+    def __init__(self, body: bytes, content_type: str):
+        self.body = body
+        self.content_type = content_type
+        digest = hashlib.sha256(body).hexdigest()
+        self.fingerprint = digest[:12]
+        self.etag = digest[:32]
+        # encoding -> (bytes, ETag), replaced as a pair so readers never mix them
+        self.variants = {"identity": (body, f'"{self.etag}"')}
+
+    @property
+    def compressible(self) -> bool:
+        return self.content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def compress(self, brotli_quality: int):
+        if not self.compressible:
+            return
+        candidates = {}
+        if "gzip" not in self.variants:
+            candidates["gzip"] = gzip.compress(self.body, compresslevel=9, mtime=0)
+        if brotli is not None:
+            candidates["br"] = brotli.compress(self.body, quality=brotli_quality)
+        for encoding, data in candidates.items():
+            # Keep an encoding only when it actually saves bytes
+            if len(data) < len(self.body):
+                # Strong ETags must differ per representation, including per brotli quality
+                suffix = f"br{brotli_quality}" if encoding == "br" else encoding
+                self.variants[encoding] = (data, f'"{self.etag}-{suffix}"')
+
+def _fingerprinted(path: str, fingerprint: str) -> str:
+    root, ext = os.path.splitext(path)
+    return f"{root}.{fingerprint}{ext}"
+
+def _accepted_encodings(header: str) -> set:
+    accepted = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name and q > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+class StaticSite:
+    '''
+    The contents of app/static, loaded into memory and precompressed once.
+
+    Every asset is also reachable under a fingerprinted name (style.<hash>.css)
+    served with immutable Cache-Control; HTML pages have their /static
+    references rewritten to those names and are revalidated with ETags.
+
+    Loading runs in a worker thread with fast brotli settings; the first
+    requests wait for it. Maximum-quality brotli variants are then built in
+    a background thread and swapped in as each one is ready.
+    '''
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.assets = {}
+        self.pages = {}
+        self._fingerprinted = {}
+        self.loaded = False
+        self._loading = None
+
+    def _load(self):
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                full_path = os.path.join(root, name)
+                path = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+                with open(full_path, "rb") as f:
+                    body = f.read()
+                total += len(body)
+                content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                asset = StaticAsset(body, content_type)
+                self.assets[path] = asset
+                self._fingerprinted[_fingerprinted(path, asset.fingerprint)] = asset
+
+        # Pages point at fingerprinted assets, so they must be built after them
+        for path, asset in self.assets.items():
+            if asset.content_type == "text/html":
+                html = asset.body.decode("utf-8")
+                html = _STATIC_REF.sub(self._rewrite_ref, html)
+                self.pages[path] = StaticAsset(html.encode("utf-8"), asset.content_type)
+
+        for asset in self._all_assets():
+            asset.compress(STARTUP_BROTLI_QUALITY)
+        self.loaded = True
+        logger.info(f"[Static] Loaded {len(self.assets)} assets ({total // 1024} KB), brotli={'on' if brotli else 'off'}")
+
+    def _all_assets(self):
+        return list(self.assets.values()) + list(self.pages.values())
+
+    def _upgrade_compression(self):
+        for asset in self._all_assets():
+            if asset.compressible:
+                asset.compress(MAX_BROTLI_QUALITY)
+        logger.info(f"[Static] Brotli quality {MAX_BROTLI_QUALITY} variants ready")
+
+    async def _load_off_loop(self):
+        await run_in_threadpool(self._load)
+        if brotli is not None:
+            threading.Thread(target=self._upgrade_compression, name="static-brotli", daemon=True).start()
+
+    def _loaded(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"[Static] Loading the static site failed: {future.exception()}")
+
+    def start(self):
+        '''
+        Begin loading in the background, so startup does not wait for it.
+        '''
+        if not self.loaded and self._loading is None:
+            self._loading = asyncio.ensure_future(self._load_off_loop())
+            self._loading.add_done_callback(self._loaded)
+
+    async def load(self):
+        '''
+        Load the site if that has not happened yet; concurrent callers share one load.
+        '''
+        if self.loaded:
+            return
+        self.start()
+        try:
+            await asyncio.shield(self._loading)
+        except Exception:
+            # Let the next request try again
+            self._loading = None
+            raise
+
+    def _rewrite_ref(self, match) -> str:
+        asset = self.assets.get(match.group(2))
+        if asset is None:
+            return match.group(0)
+        return f"{match.group(1)}/static/{_fingerprinted(match.group(2), asset.fingerprint)}{match.group(3)}"
+
+    def _respond(self, asset: StaticAsset, request, cache_control: str) -> Response:
+        accepted = _accepted_encodings(request.headers.get("accept-encoding"))
+        encoding = next((e for e in ENCODINGS if e in asset.variants and e in accepted), "identity")
+        body, etag = asset.variants[encoding]
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+        if len(asset.variants) > 1:
+            headers["Vary"] = "Accept-Encoding"
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+            return Response(status_code=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        if request.method == "HEAD":
+            headers["Content-Length"] = str(len(body))
+            body = b""
+        return Response(content=body, media_type=asset.content_type, headers=headers)
+
+    async def asset(self, request, path: str) -> Response:
+        '''
+        Response for /static/{path}, or None if there is no such asset.
+        '''
+        await self.load()
+        asset = self._fingerprinted.get(path)
+        if asset is not None:
+            return self._respond(asset, request, IMMUTABLE)
+        asset = self.assets.get(path)
+        if asset is not None:
+            return self._respond(asset, request, f"public, max-age={settings.STATIC_MAX_AGE}")
+        return None
+
+    async def page(self, request, name: str) -> Response:
+        await self.load()
+        # Pages are revalidated on every visit so a deploy's new fingerprints show up immediately
+        return self._respond(self.pages[name], request, "no-cache")
+
+static_site = StaticSite(os.path.join(os.path.dirname(os.path.dirname(__file__)), "static"))
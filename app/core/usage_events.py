@@ -0,0 +1,282 @@
+import asyncio
+import fcntl
+import glob
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from fastapi.concurrency import run_in_threadpool
+from .clients import get_supabase
+from .config import settings
+from .metrics import upstream_timer
+
+logger = logging.getLogger(__name__)
+
+# SQLSTATE classes for problems with the rows themselves: data exceptions and
+# integrity violations (e.g. a user_id with no profile row)
+_ROW_ERROR_SQLSTATE_CLASSES = ("22", "23")
+
+def _is_row_error(e: Exception) -> bool:
+    '''
+    True if the database rejected the rows themselves, so sending them again
+    will fail the same way. Transport errors, 5xx answers, and schema,
+    permission or PostgREST errors (42xxx, PGRSTxxx) are not the rows' fault;
+    those batches stay queued until the cause is fixed.
+    '''
+    from postgrest.exceptions import APIError
+    if not isinstance(e, APIError):
+        return False
+    code = str(e.code or "")
+    return len(code) == 5 and code[:2] in _ROW_ERROR_SQLSTATE_CLASSES
+
+class UsageEventPipeline:
+    '''
+    Write-behind queue for usage_logs rows.
+
+    record() queues events and returns; a background task bulk-inserts them
+    when USAGE_FLUSH_BATCH events are waiting or every USAGE_FLUSH_INTERVAL
+    seconds. Queued events are appended to a per-process spool file (bounded
+    by USAGE_SPOOL_MAX_BYTES) so they survive a crash; on startup a worker
+    replays spool files left behind by processes that are no longer running.
+    Each event carries a unique event_id, so replays never double-charge.
+
+    A batch the database rejects for its data (e.g. a user_id with no profile
+    row) is retried row by row and the offending rows are dropped, so one bad
+    event never holds up everyone else's usage. Any other error keeps the
+    batch queued and spooled, and flushing backs off.
+    '''
+
+    def __init__(self):
+        self._pending = []
+        # Batch currently being inserted; taken out of _pending so trimming
+        # the queue never touches it
+        self._inflight = []
+        self._wakeup = None
+        self._task = None
+        self._spool = None
+        self._spool_path = None
+        self._spool_full = False
+        self.flushed = 0
+        self.flush_failures = 0
+        self.dead_lettered = 0
+
+    # Spool
+
+    def _open_spool(self):
+        directory = settings.USAGE_SPOOL_DIR
+        if not directory:
+            return
+        try:
+            os.makedirs(directory, exist_ok=True)
+            self._replay_orphaned_spools(directory)
+            self._spool_path = os.path.join(directory, f"usage-{os.getpid()}.jsonl")
+            self._spool = open(self._spool_path, "a+", encoding="utf-8")
+            # Held for the life of the process; marks this spool as in use
+            fcntl.flock(self._spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self._rewrite_spool()
+        except Exception as e:
+            logger.error(f"[UsageEvents] Spool unavailable, events are memory-only: {e}")
+            self._spool = None
+
+    def _replay_orphaned_spools(self, directory: str):
+        known = {event["event_id"] for event in self._pending}
+        for path in glob.glob(os.path.join(directory, "usage-*.jsonl")):
+            try:
+                with open(path, "r+", encoding="utf-8") as f:
+                    try:
+                        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue  # Owned by a live worker
+                    replayed = 0
+                    for line in f:
+                        try:
+                            event = json.loads(line)
+                        except ValueError:
+                            continue  # Torn write from a crash
+                        if event.get("event_id") and event["event_id"] not in known:
+                            known.add(event["event_id"])
+                            self._pending.append(event)
+                            replayed += 1
+                    os.remove(path)
+                if replayed:
+                    logger.info(f"[UsageEvents] Replayed {replayed} events from {os.path.basename(path)}")
+            except Exception as e:
+                logger.error(f"[UsageEvents] Failed to replay {path}: {e}")
+
+    def _append_spool(self, events: list):
+        if not self._spool or self._spool_full:
+            return
+        lines = "".join(json.dumps(event) + "\n" for event in events)
+        if self._spool.tell() + len(lines) > settings.USAGE_SPOOL_MAX_BYTES:
+            self._spool_full = True
+            logger.error("[UsageEvents] Spool full; new events are memory-only until the next flush")
+            return
+        self._spool.write(lines)
+        self._spool.flush()
+
+    def _rewrite_spool(self):
+        if not self._spool:
+            return
+        self._spool.seek(0)
+        self._spool.truncate()
+        self._spool_full = False
+        self._append_spool(self._inflight + self._pending)
+
+    # Queue
+
+    def _ensure_started(self):
+        if self._task is None:
+            self._open_spool()
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+            logger.info("[UsageEvents] Write-behind usage logging started")
+
+    async def record(self, user_id: str, action: str, count: int = 1):
+        now = datetime.now(timezone.utc).isoformat()
+        events = [
+            {"event_id": str(uuid.uuid4()), "user_id": user_id, "action": action, "date_accessed": now}
+            for _ in range(count)
+        ]
+        if not settings.USAGE_WRITE_BEHIND:
+            await self._insert(events)
+            return
+
+        self._ensure_started()
+        self._pending.extend(events)
+        self._trim()
+        self._append_spool(events)
+        if len(self._pending) >= settings.USAGE_FLUSH_BATCH:
+            self._wakeup.set()
+
+    def _trim(self):
+        overflow = len(self._inflight) + len(self._pending) - settings.USAGE_MAX_PENDING
+        if overflow > 0:
+            logger.error(f"[UsageEvents] Queue full, dropping {overflow} oldest events")
+            del self._pending[:overflow]
+
+    def _queued_ids(self, user_id: str, since: datetime) -> set:
+        since_iso = since.isoformat()
+        return {
+            e["event_id"] for e in self._inflight + self._pending
+            if e["user_id"] == user_id and e["date_accessed"] >= since_iso
+        }
+
+    def pending_count(self, user_id: str, since: datetime) -> int:
+        '''
+        Events for user_id at or after `since` that are queued or being inserted.
+        '''
+        return len(self._queued_ids(user_id, since))
+
+    async def count_usage(self, user_id: str, since: datetime, read_committed) -> int:
+        '''
+        read_committed() (usage already in the database) plus queued events,
+        without waiting for a flush. An event queued at any point during the
+        read is counted as queued, so usage is never undercounted; at worst
+        the user's events in a batch that committed during the read count twice.
+        '''
+        before = self._queued_ids(user_id, since)
+        committed = await run_in_threadpool(read_committed)
+        return committed + len(before | self._queued_ids(user_id, since))
+
+    async def _insert(self, events: list):
+        def insert():
+            with upstream_timer("supabase", "usage_logs.upsert"):
+                get_supabase().table("usage_logs") \
+                    .upsert(events, on_conflict="event_id", ignore_duplicates=True) \
+                    .execute()
+        await run_in_threadpool(insert)
+
+    async def _write(self, batch: list) -> list:
+        '''
+        Insert a batch. Returns the events that could not be written yet.
+        '''
+        try:
+            await self._insert(batch)
+            self.flushed += len(batch)
+            return []
+        except Exception as e:
+            if not _is_row_error(e):
+                logger.error(f"[UsageEvents] Flush of {len(batch)} events failed, will retry: {e}")
+                return batch
+            logger.warning(f"[UsageEvents] Batch of {len(batch)} events rejected, retrying row by row: {e}")
+
+        for i, event in enumerate(batch):
+            try:
+                await self._insert([event])
+                self.flushed += 1
+            except Exception as e:
+                if not _is_row_error(e):
+                    logger.warning(f"[UsageEvents] Flush failed part way through a batch, will retry: {e}")
+                    return batch[i:]
+                self.dead_lettered += 1
+                logger.error(f"[UsageEvents] Dropping event rejected by the database: {json.dumps(event)}: {e}")
+        return []
+
+    async def flush(self):
+        '''
+        Insert everything queued so far, in batches. Events that could not be
+        written go back to the head of the queue.
+        '''
+        while self._pending:
+            batch = self._pending[:settings.USAGE_FLUSH_BATCH]
+            del self._pending[:len(batch)]
+            self._inflight = batch
+            unwritten = batch
+            try:
+                unwritten = await self._write(batch)
+            finally:
+                self._inflight = []
+                if unwritten:
+                    self._pending[:0] = unwritten
+            if unwritten:
+                self.flush_failures += 1
+                self._trim()
+                return False
+            self._rewrite_spool()
+        return True
+
+    async def _run(self):
+        backoff = settings.USAGE_FLUSH_INTERVAL
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=backoff)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            ok = await self.flush()
+            backoff = settings.USAGE_FLUSH_INTERVAL if ok else min(backoff * 2, 60)
+
+    async def start(self):
+        if settings.USAGE_WRITE_BEHIND:
+            self._ensure_started()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        await self.flush()
+        if self._pending:
+            logger.error(f"[UsageEvents] {len(self._pending)} events left in the spool at shutdown")
+        if self._spool:
+            empty = not self._pending
+            self._spool.close()
+            self._spool = None
+            if empty:
+                os.remove(self._spool_path)
+
+    def stats(self):
+        return {
+            "pending": len(self._pending) + len(self._inflight),
+            "flushed": self.flushed,
+            "flush_failures": self.flush_failures,
+            "dead_lettered": self.dead_lettered,
+        }
+
+usage_events = UsageEventPipeline()
@@ -0,0 +1,38 @@
+import argparse
+import logging
+from datetime import datetime, timezone
+from ..core.clients import get_supabase
+from ..routers.usage import get_current_month_start_utc, reconcile_usage_counters
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def main():
+    '''
+    Rebuild the usage_monthly counters from usage_logs.
+
+    python -m app.jobs.reconcile_usage              # current month
+    python -m app.jobs.reconcile_usage --month 2025-01
+    python -m app.jobs.reconcile_usage --all
+    '''
+    parser = argparse.ArgumentParser(description="Rebuild usage_monthly counters from usage_logs")
+    parser.add_argument("--month", help="Month to rebuild, as YYYY-MM (default: current UTC month)")
+    parser.add_argument("--all", action="store_true", help="Rebuild every month")
+    args = parser.parse_args()
+
+    if not get_supabase():
+        raise SystemExit("Supabase not configured")
+
+    if args.all:
+        month_start = None
+    elif args.month:
+        month_start = datetime.strptime(args.month, "%Y-%m").replace(tzinfo=timezone.utc)
+    else:
+        month_start = get_current_month_start_utc()
+
+    written = reconcile_usage_counters(month_start)
+    label = month_start.strftime("%Y-%m") if month_start else "all months"
+    logger.info(f"Reconciled usage counters for {label}: {written} rows")
+
+if __name__ == "__main__":
+    main()
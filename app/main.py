@@ -1,12 +1,26 @@
+from .core.startup import mark, get_startup_stats
 import logging
-import os
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import PlainTextResponse
 from .routers import onboarding, user, outreach, search, usage
-from .core.clients import supabase
+from .core.clients import start_http_clients, close_http_clients
+from .core.extraction import shutdown_extraction_pool
+from .core.usage_events import usage_events
+from .core.contact_mail import contact_mailer
+from .core.request_logging import RequestLoggingMiddleware, start_log_queue, stop_log_queue
+from .core.admission import AdmissionMiddleware, get_admission_stats
+from .core.body_limit import BodySizeLimitMiddleware
+from .core.metrics import MetricsMiddleware, register_stats, render_metrics
+from .core.auth import get_auth_cache_stats
+from .core.extpay import get_tier_cache_stats
+from .core.profiles import get_profile_cache_stats
+from .core.prompt_cache import get_prompt_cache_stats
+from .core.coalesce import get_coalesce_stats
+from .core.config import settings
+from .core.static_assets import static_site
 from pydantic import BaseModel
 
 # Logging
@@ -18,35 +32,42 @@ class ContactRequest(BaseModel):
     email: str
     message: str
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_log_queue()
+    # Loaded in the background; only static requests wait for it
+    static_site.start()
+    await start_http_clients()
+    await usage_events.start()
+    await contact_mailer.start()
+    mark("ready")
+    yield
+    await contact_mailer.stop()
+    await usage_events.stop()
+    await close_http_clients()
+    shutdown_extraction_pool()
+    stop_log_queue()
+
 app = FastAPI(
     title="Sendy AI Backend",
     description="Modularized FastAPI backend for Sendy AI LinkedIn Extension",
-    version="1.1.0"
+    version="1.1.0",
+    lifespan=lifespan
 )
 
-@app.middleware("http")
-async def log_requests(request, call_next):
-    # Log full URL with query params
-    logger.info(f"Incoming Request: {request.method} {request.url}")
-    logger.info(f"Headers: x-extpay-key={request.headers.get('x-extpay-key')}, auth={bool(request.headers.get('Authorization'))}")
-    
-    # Log body for POST/PUT/PATCH
-    if request.method in ["POST", "PUT", "PATCH"]:
-        body = await request.body()
-        try:
-            decoded_body = body.decode('utf-8')
-            logger.info(f"Request Body: {decoded_body}")
-        except UnicodeDecodeError:
-            logger.info("Request Body: <binary data>")
-        
-        # Re-set body so it can be read again by the router
-        async def receive():
-            return {"type": "http.request", "body": body}
-        request._receive = receive
-
-    response = await call_next(request)
-    logger.info(f"Response Status: {response.status_code}")
-    return response
+# Admission control for LLM, Hunter and parsing routes (innermost, so
+# rejections are still logged, measured and get CORS headers)
+app.add_middleware(AdmissionMiddleware)
+
+# Upload size limits, enforced before the body is read (outside admission, so
+# oversized uploads never take a slot)
+app.add_middleware(BodySizeLimitMiddleware)
+
+# Structured request logging (pure ASGI, does not buffer request bodies)
+app.add_middleware(RequestLoggingMiddleware)
+
+# Per-route latency metrics and Server-Timing
+app.add_middleware(MetricsMiddleware)
 
 # CORS - Must be added AFTER other middlewares to be the outermost layer
 app.add_middleware(
@@ -69,62 +90,62 @@ app.include_router(outreach.router)
 app.include_router(search.router)
 app.include_router(usage.router)
 
-# Serve Static Files (CSS, JS, etc.)
-static_path = os.path.join(os.path.dirname(__file__), "static")
-app.mount("/static", StaticFiles(directory=static_path), name="static")
+# Cache and queue stats exposed on /metrics
+register_stats("auth", get_auth_cache_stats)
+register_stats("tier", get_tier_cache_stats)
+register_stats("profile", get_profile_cache_stats)
+register_stats("prompt", get_prompt_cache_stats)
+register_stats("coalesce", get_coalesce_stats)
+register_stats("outreach", outreach.get_outreach_cache_stats)
+register_stats("resume", onboarding.get_resume_cache_stats)
+register_stats("email_lookup", search.email_cache.stats)
+register_stats("email_patterns", search.email_patterns.stats)
+register_stats("usage_events", usage_events.stats)
+register_stats("contact_mail", contact_mailer.stats)
+register_stats("admission", get_admission_stats)
+register_stats("startup", get_startup_stats)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(authorization: str = Header(None)):
+    if settings.METRICS_TOKEN and authorization != f"Bearer {settings.METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# Static site, served from memory (precompressed, fingerprinted, ETag'd)
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def static_files(request: Request, path: str):
+    response = await static_site.asset(request, path)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return response
 
 @app.get("/")
-async def root():
+async def root(request: Request):
     # Serve index.html (renamed home.html) at the root
-    return FileResponse(os.path.join(static_path, "index.html"))
+    return await static_site.page(request, "index.html")
 
 @app.get("/contact")
-async def contact():
-    return FileResponse(os.path.join(static_path, "contact.html"))
+async def contact(request: Request):
+    return await static_site.page(request, "contact.html")
 
 @app.get("/privacy-policy")
-async def privacy_policy():
-    return FileResponse(os.path.join(static_path, "privacy.html"))
+async def privacy_policy(request: Request):
+    return await static_site.page(request, "privacy.html")
 
 @app.get("/404")
-async def not_found():
-    return FileResponse(os.path.join(static_path, "404.html"))
+async def not_found(request: Request):
+    return await static_site.page(request, "404.html")
 
 @app.post("/contact")
 async def post_contact(request: ContactRequest):
     logger.info(f"Contact form submission from: {request.name} <{request.email}>")
     try:
-        import smtplib
-        from email.mime.text import MIMEText
-
-        app_password = os.getenv("GMAIL_APP_PASSWORD")
-        to_email = "sendynetworking@gmail.com"
-
-        subject = f"[SENDY CONTACT FORM]: {request.name}"
-        body = (
-            f"Name: {request.name}\n"
-            f"Email: {request.email}\n\n"
-            f"Message:\n{request.message}"
-        )
-
-        msg = MIMEText(body)
-        msg["Subject"] = subject
-        msg["From"] = to_email
-        msg["To"] = to_email
-        msg["Reply-To"] = request.email
-
-        if app_password:
-            with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-                server.login(to_email, app_password)
-                server.send_message(msg)
-            logger.info("Contact email sent successfully")
-        else:
-            logger.warning("GMAIL_APP_PASSWORD not set — contact submission logged only")
-
-        return {"status": "success", "message": "Thank you for your message! We'll get back to you soon."}
+        await contact_mailer.send(request.name, request.email, request.message)
     except Exception as e:
-        logger.error(f"Error sending contact email: {e}")
-        return {"status": "success", "message": "Thank you for your message! We'll get back to you soon."}
+        logger.error(f"Error queueing contact email: {e}")
+    return {"status": "success", "message": "Thank you for your message! We'll get back to you soon."}
+
+mark("imported")
 
 if __name__ == "__main__":
     import uvicorn
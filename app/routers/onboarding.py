@@ -1,38 +1,54 @@
-import os
-import shutil
-import tempfile
 import logging
 import json
 import re
 import traceback
-import pdfplumber
-from docx import Document
 from fastapi import APIRouter, UploadFile, File, HTTPException
-from ..core.clients import anthropic_client
+from ..core.clients import get_async_anthropic_client
 from ..core.config import settings
+from ..core.metrics import upstream_timer
+from ..core.content_cache import ContentCache, content_hash
+from ..core.prompt_cache import record_usage
+from ..core.extraction import EXTRACTOR_VERSION, extract_text_from_pdf, extract_text_from_docx
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/onboarding", tags=["onboarding"])
 
-def extract_text_from_pdf(path):
-    text = ""
-    try:
-        with pdfplumber.open(path) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-    except Exception as e:
-        logger.error(f"Error extracting PDF text: {e}")
-    return text
+# Bump whenever the parser prompt changes so cached results are not reused
+RESUME_PROMPT_VERSION = "2"
 
-def extract_text_from_docx(path):
-    try:
-        doc = Document(path)
-        return "\n".join(p.text for p in doc.paragraphs)
-    except Exception as e:
-        logger.error(f"Error extracting DOCX text: {e}")
-        return ""
+# Static parser instructions. At about 200 tokens this is far below the
+# minimum cacheable prefix, so it is sent without cache_control.
+RESUME_PARSER_PROMPT = """
+        You are a resume parser. Output only valid JSON, no other text.
+
+        Analyze the resume text in the user message and extract information into a VALID JSON format.
+        
+        REQUIRED JSON STRUCTURE:
+        {
+            "name": "Full Name",
+            "email": "Email Address",
+            "university": ["List of Universities"],
+            "degree": ["List of Degrees"],
+            "skills": ["List of Professional Skills"],
+            "experiences": [
+                {
+                    "title": "Job Title",
+                    "company": "Company Name",
+                    "start_date": "Start Date",
+                    "end_date": "End Date or Present",
+                    "description": "Short description"
+                }
+            ]
+        }
+        """
+
+# Extracted text and parsed profiles are cached as separate layers, both keyed
+# by the SHA-256 of the uploaded bytes
+text_cache = ContentCache("resume_text", settings.RESUME_CACHE_SIZE, settings.RESUME_CACHE_DIR)
+parsed_cache = ContentCache("resume_parsed", settings.RESUME_CACHE_SIZE, settings.RESUME_CACHE_DIR)
+
+def get_resume_cache_stats():
+    return {"text": text_cache.stats(), "parsed": parsed_cache.stats()}
 
 @router.post("/parse")
 async def parse_resume(file: UploadFile = File(...)):
@@ -40,62 +56,63 @@ async def parse_resume(file: UploadFile = File(...)):
     Parse resume file and extract relevant information using Claude
     '''
 
-    temp_dir = tempfile.mkdtemp()
-    temp_path = os.path.join(temp_dir, file.filename)
-    
+    # Read the upload into memory, refusing anything over the size limit
+    data = await file.read(settings.RESUME_MAX_BYTES + 1)
+    if len(data) > settings.RESUME_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {settings.RESUME_MAX_BYTES // (1024 * 1024)} MB.")
+
+    filename = (file.filename or "").lower()
+    if filename.endswith(".pdf"):
+        kind = "pdf"
+    elif filename.endswith((".docx", ".doc")):
+        kind = "docx"
+    else:
+        raise HTTPException(status_code=400, detail="Unsupported file format. Please upload PDF or DOCX.")
+
+    digest = content_hash(data)
+    parsed_key = f"{digest}:{settings.ANTHROPIC_MODEL}:{RESUME_PROMPT_VERSION}"
+    cached = await parsed_cache.get(parsed_key)
+    if cached is not None:
+        parsed_cache.bytes_saved += len(data)
+        logger.info(f"Resume cache hit for {digest[:12]} ({len(data)} bytes)")
+        return cached
+
     try:
-        with open(temp_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        text = ""
-        if file.filename.lower().endswith(".pdf"):
-            text = extract_text_from_pdf(temp_path)
-        elif file.filename.lower().endswith((".docx", ".doc")):
-            text = extract_text_from_docx(temp_path)
+        text_key = f"{digest}:{kind}:{EXTRACTOR_VERSION}"
+        text = await text_cache.get(text_key)
+        if text is not None:
+            text_cache.bytes_saved += len(data)
         else:
-            raise HTTPException(status_code=400, detail="Unsupported file format. Please upload PDF or DOCX.")
+            if kind == "pdf":
+                text = await extract_text_from_pdf(data)
+            else:
+                text = await extract_text_from_docx(data)
+            if text.strip():
+                await text_cache.set(text_key, text)
 
         if not text.strip():
             raise ValueError("Could not extract any text from the file.")
 
         # Use Claude for Parsing
-        if not anthropic_client:
+        if not get_async_anthropic_client():
             raise HTTPException(status_code=500, detail="Anthropic client not initialized")
 
         prompt = f"""
-        Analyze the following resume text and extract information into a VALID JSON format.
-        
-        REQUIRED JSON STRUCTURE:
-        {{
-            "name": "Full Name",
-            "email": "Email Address",
-            "university": ["List of Universities"],
-            "degree": ["List of Degrees"],
-            "skills": ["List of Professional Skills"],
-            "experiences": [
-                {{
-                    "title": "Job Title",
-                    "company": "Company Name",
-                    "start_date": "Start Date",
-                    "end_date": "End Date or Present",
-                    "description": "Short description"
-                }}
-            ]
-        }}
-
         RESUME TEXT:
         {text[:10000]}
         """
 
         try:
-            response = anthropic_client.messages.create(
-                model=settings.ANTHROPIC_MODEL,
-                max_tokens=2048,
-                system="You are a resume parser. Output only valid JSON, no other text.",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
+            async with upstream_timer("anthropic", "messages.create"):
+                response = await get_async_anthropic_client().messages.create(
+                    model=settings.ANTHROPIC_MODEL,
+                    max_tokens=2048,
+                    system=RESUME_PARSER_PROMPT,
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ]
+                )
+            record_usage("resume_parser", response.usage)
             
             # Extract JSON from response
             raw_response = response.content[0].text
@@ -119,6 +136,7 @@ async def parse_resume(file: UploadFile = File(...)):
             }
             
             logger.info(f"Successfully parsed resume for: {response_data['name']}")
+            await parsed_cache.set(parsed_key, response_data)
             return response_data
 
         except Exception as e:
@@ -129,6 +147,3 @@ async def parse_resume(file: UploadFile = File(...)):
         logger.error(f"General parsing error: {e}")
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
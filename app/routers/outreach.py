@@ -1,66 +1,62 @@
+import asyncio
+import hashlib
+import json
 import logging
 import traceback
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException, Header, Response
+from fastapi.responses import StreamingResponse
 from .usage import verify_usage
-from ..schemas.profile import OutreachRequest
-from ..core.clients import supabase, anthropic_client
+from ..schemas.profile import OutreachRequest, BulkOutreachRequest
+from ..core.clients import get_supabase, get_async_anthropic_client
 from ..core.auth import get_user_id
+from ..core.cache import TTLCache
+from ..core.coalesce import coalesce, request_key
 from ..core.config import settings
+from ..core.metrics import upstream_timer
+from ..core.profiles import get_profile
+from ..core.prompt_cache import cached_system, record_usage
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/outreach", tags=["outreach"])
 
-@router.post("/generate")
-async def generate_outreach(
-    req: OutreachRequest, 
-    user_id: str = Depends(get_user_id),
-    x_extpay_key: str = Header(None)
-):
-    '''
-    Generate outreach email for a given recipient profile
-    '''
-    
-    if not supabase or not anthropic_client:
-        raise HTTPException(status_code=500, detail="Services not configured")
+# Profile columns the outreach prompt uses
+SENDER_COLUMNS = ("name", "raw_summary", "skills")
 
-    # Lookup user profile
+# Bump whenever the outreach prompt changes so cached emails are not reused
+OUTREACH_PROMPT_VERSION = "3"
+# Recipient fields the prompt reads; only these go into the cache key
+RECIPIENT_FIELDS = ("name", "headline", "experience", "education", "honors")
+
+# Generated emails keyed by sender, sender profile version, recipient
+# fingerprint, model and prompt version. A profile save changes updated_at,
+# so edits to the sender's profile never reuse an older email.
+_email_cache = TTLCache(maxsize=settings.OUTREACH_CACHE_SIZE, ttl=settings.OUTREACH_CACHE_TTL)
+
+# Claude calls in flight for batch generation, across all users and per user
+_global_slots = asyncio.Semaphore(settings.OUTREACH_GLOBAL_CONCURRENCY)
+_user_slots = {}  # user_id -> [semaphore, batches using it]
+
+def load_sender_profile(user_id: str) -> dict:
+    # Lookup user profile (cached, only the columns the prompt needs)
     try:
-        user_profile = supabase.table("profiles").select("*").eq("id", user_id).single().execute()
-        if not user_profile.data:
-            logger.warning(f"Profile not found for user_id: {user_id}")
-            raise HTTPException(status_code=400, detail="User profile not set up. Please complete onboarding in the extension options.")
+        user_profile = get_profile(user_id, SENDER_COLUMNS)
     except Exception as e:
         logger.error(f"Supabase lookup error for {user_id}: {e}")
         raise HTTPException(status_code=500, detail="Database lookup failed")
-    
-    user = user_profile.data
-    recipient = req.profileData
-    
-    exp_list = "\n".join([f"- {e.get('title')} at {e.get('company')} ({e.get('dates')})" for e in recipient.get('experience', [])])
-    edu_list = "\n".join([f"- {e.get('school')}: {e.get('degree')} ({e.get('dates')})" for e in recipient.get('education', [])])
-    honors_list = "\n".join([f"- {h.get('title')} from {h.get('issuer')} ({h.get('date')})" for h in recipient.get('honors', [])])
 
-    recipient_first_name = (recipient.get("name") or "").strip().split(" ")[0] or "there"
+    if not user_profile:
+        logger.warning(f"Profile not found for user_id: {user_id}")
+        raise HTTPException(status_code=400, detail="User profile not set up. Please complete onboarding in the extension options.")
+    return user_profile
 
-    system_prompt = f"""
+# Static instructions, sent as a cacheable system prefix. Everything that varies
+# per request (sender, recipient, and the rendered greeting and sign-off) goes in
+# the user message after it. The prefix is close to the minimum cacheable length
+# (see prompt_cache.py); record_usage warns if it is not being cached.
+OUTREACH_SYSTEM_PROMPT = """
     You are an expert networking assistant. You help high-achieving students draft initial outreach emails to busy professionals in finance, consulting, tech, and law.
 
-    CONTEXT (DO NOT IGNORE):
-    SENDER: {user['name']}
-    SENDER BACKGROUND: {user['raw_summary']}
-    SENDER SKILLS: {', '.join(user.get('skills', []))}
-
-    RECIPIENT: {recipient.get('name')}
-    RECIPIENT HEADLINE: {recipient.get('headline')}
-
-    RECIPIENT EXPERIENCE:
-    {exp_list}
-
-    RECIPIENT EDUCATION:
-    {edu_list}
-
-    RECIPIENT HONORS & AWARDS:
-    {honors_list}
+    The CONTEXT for each email (sender and recipient details) is given in the user message. DO NOT IGNORE IT.
 
     GENERAL STYLE RULES:
     - Audience: Busy professionals. Time is money.
@@ -76,9 +72,7 @@ async def generate_outreach(
     ⚠️ CRITICAL OUTPUT RULE:
     Output ONLY the raw email text. DO NOT include any structural labels or markers (e.g., "SUBJECT LINE:", "PARAGRAPH 1:").
     Output ONLY the final email text (subject line + body). No placeholders.
-    """
 
-    user_message = f"""
     YOUR TASK:
     Perform a two-step process internally, then output ONLY the final email text with NO LABELS.
 
@@ -93,7 +87,7 @@ async def generate_outreach(
     - Make sure the connection snippet is accurate to whether the sender is a student.
 
     Then a blank line, then:
-    Hi {recipient_first_name},
+    [GREETING from the user message, exactly as written]
 
     First paragraph (The Hook):
     - Include the phrase: "Hope you are doing well."
@@ -120,12 +114,64 @@ async def generate_outreach(
     Fourth paragraph (Closing):
     I look forward to hearing back from you!
 
+    [SIGN-OFF from the user message, exactly as written]
+    """
+
+def build_outreach_prompts(user: dict, recipient: dict):
+    exp_list = "\n".join([f"- {e.get('title')} at {e.get('company')} ({e.get('dates')})" for e in recipient.get('experience', [])])
+    edu_list = "\n".join([f"- {e.get('school')}: {e.get('degree')} ({e.get('dates')})" for e in recipient.get('education', [])])
+    honors_list = "\n".join([f"- {h.get('title')} from {h.get('issuer')} ({h.get('date')})" for h in recipient.get('honors', [])])
+
+    recipient_first_name = (recipient.get("name") or "").strip().split(" ")[0] or "there"
+
+    user_message = f"""
+    CONTEXT (DO NOT IGNORE):
+    SENDER: {user['name']}
+    SENDER BACKGROUND: {user['raw_summary']}
+    SENDER SKILLS: {', '.join(user.get('skills', []))}
+
+    RECIPIENT: {recipient.get('name')}
+    RECIPIENT FIRST NAME: {recipient_first_name}
+    RECIPIENT HEADLINE: {recipient.get('headline')}
+
+    RECIPIENT EXPERIENCE:
+    {exp_list}
+
+    RECIPIENT EDUCATION:
+    {edu_list}
+
+    RECIPIENT HONORS & AWARDS:
+    {honors_list}
+
+    GREETING:
+    Hi {recipient_first_name},
+
+    SIGN-OFF:
     Best,
     {user['name']}
+
+    Write the email for this sender and recipient, following YOUR TASK.
     """
 
-    try:
-        response = anthropic_client.messages.create(
+    return cached_system(OUTREACH_SYSTEM_PROMPT), user_message
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def outreach_cache_key(user_id: str, user: dict, recipient: dict) -> str:
+    fingerprint = {field: recipient.get(field) for field in RECIPIENT_FIELDS}
+    canonical = json.dumps(
+        [user_id, user.get("updated_at"), fingerprint, settings.ANTHROPIC_MODEL, OUTREACH_PROMPT_VERSION],
+        sort_keys=True, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def get_outreach_cache_stats():
+    return _email_cache.stats()
+
+async def _create_email(system_prompt, user_message: str) -> str:
+    async with upstream_timer("anthropic", "messages.create"):
+        response = await get_async_anthropic_client().messages.create(
             model=settings.ANTHROPIC_MODEL,
             max_tokens=1024,
             system=system_prompt,
@@ -133,12 +179,295 @@ async def generate_outreach(
                 {"role": "user", "content": user_message}
             ]
         )
+    record_usage("outreach", response.usage, cached_prefix=True)
+    return response.content[0].text
+
+def _acquire_user_slots(user_id: str) -> asyncio.Semaphore:
+    entry = _user_slots.setdefault(user_id, [asyncio.Semaphore(settings.OUTREACH_USER_CONCURRENCY), 0])
+    entry[1] += 1
+    return entry[0]
+
+def _release_user_slots(user_id: str):
+    entry = _user_slots[user_id]
+    entry[1] -= 1
+    if entry[1] == 0:
+        del _user_slots[user_id]
+
+def _batch_owner(user_id: str) -> str:
+    # Prefix of every custom_id in a user's Message Batch; ties results to the user
+    return hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:16]
+
+def _record_batch(batch_id: str, user_id: str):
+    with upstream_timer("supabase", "outreach_batches.insert"):
+        get_supabase().table("outreach_batches").insert({"batch_id": batch_id, "user_id": user_id}).execute()
+
+def _batch_belongs_to(batch_id: str, user_id: str) -> bool:
+    with upstream_timer("supabase", "outreach_batches.select"):
+        res = get_supabase().table("outreach_batches") \
+            .select("user_id") \
+            .eq("batch_id", batch_id) \
+            .limit(1) \
+            .execute()
+    return bool(res.data) and res.data[0]["user_id"] == user_id
+
+@router.post("/generate")
+async def generate_outreach(
+    req: OutreachRequest, 
+    user_id: str = Depends(get_user_id),
+    x_extpay_key: str = Header(None)
+):
+    '''
+    Generate outreach email for a given recipient profile.
+    Duplicate requests already in flight share one Claude call.
+    '''
+    key = request_key("outreach_generate", user_id, req)
+    return await coalesce(key, _generate_outreach, req, user_id)
+
+async def _generate_outreach(req: OutreachRequest, user_id: str):
+    if not get_supabase() or not get_async_anthropic_client():
+        raise HTTPException(status_code=500, detail="Services not configured")
+
+    user = load_sender_profile(user_id)
+    cache_key = outreach_cache_key(user_id, user, req.profileData)
+    if not req.regenerate:
+        email = _email_cache.get(cache_key)
+        if email is not None:
+            logger.info(f"[Outreach] Cache hit for user {user_id}")
+            return {"success": True, "email": email, "cached": True}
+
+    system_prompt, user_message = build_outreach_prompts(user, req.profileData)
+
+    try:
+        email = await _create_email(system_prompt, user_message)
+        _email_cache.set(cache_key, email)
         
         return {
             "success": True,
-            "email": response.content[0].text
+            "email": email
         }
     except Exception as e:
         logger.error(f"Generation error: {e}")
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"AI generation failed: {str(e)}")
+
+@router.post("/generate/stream")
+async def generate_outreach_stream(
+    req: OutreachRequest,
+    user_id: str = Depends(get_user_id),
+    x_extpay_key: str = Header(None)
+):
+    '''
+    Stream the outreach email as Server-Sent Events while Claude writes it.
+    Emits "delta" events with text chunks, then a "done" event with the full
+    email (same shape as /outreach/generate), or an "error" event.
+    '''
+
+    if not get_supabase() or not get_async_anthropic_client():
+        raise HTTPException(status_code=500, detail="Services not configured")
+
+    # Profile problems surface as normal HTTP errors before the stream opens
+    user = load_sender_profile(user_id)
+    cache_key = outreach_cache_key(user_id, user, req.profileData)
+    cached_email = None if req.regenerate else _email_cache.get(cache_key)
+    system_prompt, user_message = build_outreach_prompts(user, req.profileData)
+
+    async def event_stream():
+        if cached_email is not None:
+            logger.info(f"[Outreach] Cache hit for user {user_id}")
+            yield _sse("delta", {"text": cached_email})
+            yield _sse("done", {"success": True, "email": cached_email, "cached": True})
+            return
+
+        chunks = []
+        try:
+            async with upstream_timer("anthropic", "messages.stream"), get_async_anthropic_client().messages.stream(
+                model=settings.ANTHROPIC_MODEL,
+                max_tokens=1024,
+                system=system_prompt,
+                messages=[
+                    {"role": "user", "content": user_message}
+                ]
+            ) as stream:
+                async for text in stream.text_stream:
+                    chunks.append(text)
+                    yield _sse("delta", {"text": text})
+                record_usage("outreach", (await stream.get_final_message()).usage, cached_prefix=True)
+            email = "".join(chunks)
+            _email_cache.set(cache_key, email)
+            yield _sse("done", {"success": True, "email": email})
+        except Exception as e:
+            logger.error(f"Streaming generation error: {e}")
+            logger.error(traceback.format_exc())
+            yield _sse("error", {"success": False, "detail": f"AI generation failed: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/generate/batch")
+async def generate_outreach_batch(
+    req: BulkOutreachRequest,
+    response: Response,
+    user_id: str = Depends(get_user_id),
+    x_extpay_key: str = Header(None)
+):
+    '''
+    Generate outreach emails for many recipients from one sender. The sender
+    profile is loaded once and Claude calls run under per-user and global
+    concurrency limits. Each email is streamed back as an NDJSON line
+    ({"index", "email", "success"[, "cached" | "error"]}) as soon as it is written.
+
+    With lowPriority, the requests are submitted through the Message Batches
+    API instead and a batchId is returned (202); poll GET /outreach/batch/{batchId}.
+    '''
+
+    if not get_supabase() or not get_async_anthropic_client():
+        raise HTTPException(status_code=500, detail="Services not configured")
+    if not req.profiles:
+        raise HTTPException(status_code=400, detail="No recipients given")
+    if len(req.profiles) > settings.OUTREACH_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Too many recipients. Maximum is {settings.OUTREACH_BATCH_MAX_ITEMS} per request.")
+
+    user = load_sender_profile(user_id)
+    prompts = [build_outreach_prompts(user, recipient) for recipient in req.profiles]
+    logger.info(f"[Outreach] Batch of {len(prompts)} emails for user {user_id} (lowPriority={req.lowPriority})")
+
+    if req.lowPriority:
+        owner = _batch_owner(user_id)
+        try:
+            async with upstream_timer("anthropic", "batches.create"):
+                batch = await get_async_anthropic_client().messages.batches.create(
+                    requests=[
+                        {
+                            "custom_id": f"{owner}-{index}",
+                            "params": {
+                                "model": settings.ANTHROPIC_MODEL,
+                                "max_tokens": 1024,
+                                "system": system_prompt,
+                                "messages": [{"role": "user", "content": user_message}]
+                            }
+                        }
+                        for index, (system_prompt, user_message) in enumerate(prompts)
+                    ]
+                )
+        except Exception as e:
+            logger.error(f"Batch submission error: {e}")
+            raise HTTPException(status_code=500, detail=f"AI generation failed: {str(e)}")
+
+        # Polling is only allowed for the submitter, so the batch is useless unrecorded
+        try:
+            _record_batch(batch.id, user_id)
+        except Exception as e:
+            logger.error(f"Failed to record owner of batch {batch.id}, cancelling it: {e}")
+            try:
+                await get_async_anthropic_client().messages.batches.cancel(batch.id)
+            except Exception as cancel_error:
+                logger.error(f"Failed to cancel batch {batch.id}: {cancel_error}")
+            raise HTTPException(status_code=500, detail="Batch submission failed")
+
+        response.status_code = 202
+        return {"success": True, "batchId": batch.id, "status": batch.processing_status, "count": len(prompts)}
+
+    cache_keys = [outreach_cache_key(user_id, user, recipient) for recipient in req.profiles]
+
+    async def generate(index: int, system_prompt, user_message: str, user_slots: asyncio.Semaphore):
+        if not req.regenerate:
+            email = _email_cache.get(cache_keys[index])
+            if email is not None:
+                return {"index": index, "email": email, "success": True, "cached": True}
+        async with user_slots, _global_slots:
+            email = await _create_email(system_prompt, user_message)
+        _email_cache.set(cache_keys[index], email)
+        return {"index": index, "email": email, "success": True}
+
+    async def results():
+        user_slots = _acquire_user_slots(user_id)
+        tasks = {
+            asyncio.create_task(generate(index, system_prompt, user_message, user_slots)): index
+            for index, (system_prompt, user_message) in enumerate(prompts)
+        }
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        logger.error(f"Batch generation error: {e}")
+                        result = {"index": tasks[task], "email": "", "success": False, "error": f"AI generation failed: {str(e)}"}
+                    yield json.dumps(result) + "\n"
+        finally:
+            # Client went away: stop spending Claude calls on the rest
+            for task in pending:
+                task.cancel()
+            _release_user_slots(user_id)
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@router.get("/batch/{batch_id}")
+async def get_outreach_batch(
+    batch_id: str,
+    user_id: str = Depends(get_user_id)
+):
+    '''
+    Status of a low-priority batch submitted by the caller. Once it has ended,
+    returns the emails (same shape as the NDJSON lines of /outreach/generate/batch).
+    '''
+
+    if not get_supabase() or not get_async_anthropic_client():
+        raise HTTPException(status_code=500, detail="Services not configured")
+
+    # Someone else's batch looks like a missing one, whatever its state
+    try:
+        owned = _batch_belongs_to(batch_id, user_id)
+    except Exception as e:
+        logger.error(f"Batch owner lookup error: {e}")
+        raise HTTPException(status_code=500, detail="Batch lookup failed")
+    if not owned:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    # Already loaded by the client above; imported here for its error types
+    import anthropic
+
+    try:
+        async with upstream_timer("anthropic", "batches.retrieve"):
+            batch = await get_async_anthropic_client().messages.batches.retrieve(batch_id)
+    except anthropic.NotFoundError:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    except Exception as e:
+        logger.error(f"Batch lookup error: {e}")
+        raise HTTPException(status_code=500, detail="Batch lookup failed")
+
+    if batch.processing_status != "ended":
+        return {
+            "success": True,
+            "batchId": batch.id,
+            "status": batch.processing_status,
+            "counts": batch.request_counts.model_dump()
+        }
+
+    prefix = f"{_batch_owner(user_id)}-"
+    emails = []
+    try:
+        async with upstream_timer("anthropic", "batches.results"):
+            async for entry in await get_async_anthropic_client().messages.batches.results(batch_id):
+                if not entry.custom_id.startswith(prefix):
+                    continue
+                index = int(entry.custom_id[len(prefix):])
+                if entry.result.type == "succeeded":
+                    emails.append({"index": index, "email": entry.result.message.content[0].text, "success": True})
+                else:
+                    emails.append({"index": index, "email": "", "success": False, "error": f"AI generation {entry.result.type}"})
+    except Exception as e:
+        logger.error(f"Batch results error: {e}")
+        raise HTTPException(status_code=500, detail="Batch lookup failed")
+
+    # Results also carry the owner prefix, as a second check
+    if not emails:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    emails.sort(key=lambda e: e["index"])
+    return {"success": True, "batchId": batch.id, "status": batch.processing_status, "emails": emails}
@@ -1,16 +1,202 @@
+import asyncio
+import json
 import logging
 import traceback
-import requests as py_requests
 from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi.responses import StreamingResponse
 from .usage import verify_usage
-from ..schemas.profile import SearchRequest
-from ..core.clients import supabase
+from ..schemas.profile import SearchRequest, BulkSearchRequest
+from ..core.clients import get_supabase, upstream_get
 from ..core.auth import get_user_id
+from ..core.coalesce import coalesce, request_key
 from ..core.config import settings
+from ..core.email_cache import create_email_cache, handle_key, name_key
+from ..core.email_patterns import PatternIndex
+from ..core.ratelimit import TokenBucket
+from ..core.usage_events import usage_events
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api", tags=["search"])
 
+email_cache = create_email_cache(get_supabase)
+email_patterns = PatternIndex(email_cache.store)
+
+# Every Hunter call in this process goes through one rate limiter
+hunter_rate_limit = TokenBucket(rate=settings.HUNTER_RATE_LIMIT)
+
+def extract_linkedin_handle(linkedin_url: str):
+    if not linkedin_url:
+        return None
+    parts = [p for p in linkedin_url.split('/') if p]
+    if 'in' in parts:
+        idx = parts.index('in')
+        if idx + 1 < len(parts):
+            return parts[idx + 1]
+    return None
+
+def build_attempts(hunter_key: str, handle: str, full_name: str, company: str, skip_keys=()) -> list:
+    '''
+    Hunter email-finder attempts in preference order, minus any whose cache key
+    is in skip_keys (already known to come back empty).
+    '''
+    attempts = []
+    h_key = handle_key(handle)
+    if handle and h_key not in skip_keys:
+        attempts.append({
+            "name": "Attempt 1 (LinkedIn handle)",
+            "key": h_key,
+            "params": {"api_key": hunter_key, "linkedin_handle": handle}
+        })
+    n_key = name_key(full_name, company) if full_name and company else None
+    if full_name and company and n_key not in skip_keys:
+        attempts.append({
+            "name": "Attempt 2 (name + company)",
+            "key": n_key,
+            "params": {"api_key": hunter_key, "full_name": full_name, "company": company}
+        })
+    return attempts
+
+async def run_attempt(attempt: dict):
+    '''
+    Returns (email, answered). answered is False when Hunter did not give a
+    usable response, so the miss must not be cached.
+    '''
+    await hunter_rate_limit.acquire()
+    logger.info(f"DEBUG: Calling Hunter.io API ({attempt['name']})...")
+    h_res = await upstream_get("hunter", "/v2/email-finder", params=attempt["params"])
+    logger.info(f"DEBUG: {attempt['name']} Response Status: {h_res.status_code}")
+
+    h_data = h_res.json()
+    if h_data.get("data") and h_data["data"].get("email"):
+        email = h_data["data"]["email"]
+        logger.info(f"Hunter found email in {attempt['name']}: {email}")
+        return email, True
+
+    logger.info(f"DEBUG: {attempt['name']} failed or returned no email.")
+    return None, h_res.is_success
+
+async def race_attempts(attempts: list, policy: str = "hedged", hedge_delay: float = 1.5, deadline: float = 12.0):
+    '''
+    Run Hunter attempts under a strategy and return (email, missed_keys).
+
+    serial:   one attempt at a time, in order
+    parallel: all attempts at once
+    hedged:   start the next attempt when the previous one comes back empty,
+              or has not answered within hedge_delay seconds
+    The first valid email wins and the remaining attempts are cancelled.
+    Nothing is returned after `deadline` seconds.
+    '''
+    loop = asyncio.get_running_loop()
+    end = loop.time() + deadline
+    queue = list(attempts)
+    running = {}
+    email = None
+    missed_keys = []
+
+    def launch():
+        attempt = queue.pop(0)
+        running[asyncio.create_task(run_attempt(attempt))] = attempt
+
+    try:
+        if queue:
+            launch()
+        while policy == "parallel" and queue:
+            launch()
+
+        while running:
+            remaining = end - loop.time()
+            if remaining <= 0:
+                logger.warning(f"Hunter deadline of {deadline}s reached with {len(running)} attempt(s) running")
+                break
+            hedging = policy == "hedged" and queue
+            done, _ = await asyncio.wait(
+                running,
+                timeout=min(remaining, hedge_delay) if hedging else remaining,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                if hedging:
+                    logger.info("DEBUG: Hedging - starting next Hunter attempt")
+                    launch()
+                continue
+
+            for task in done:
+                attempt = running.pop(task)
+                try:
+                    found, answered = task.result()
+                except Exception as e:
+                    logger.error(f"Hunter integration error in {attempt['name']}: {e}")
+                    continue
+                if found and not email:
+                    email = found
+                elif answered and not found:
+                    missed_keys.append(attempt["key"])
+            if email:
+                break
+            if queue and not running:
+                launch()
+    finally:
+        for task in running:
+            task.cancel()
+
+    return email, missed_keys
+
+async def lookup_email(linkedin_url: str, full_name: str, company: str):
+    '''
+    Find an email via the lookup cache, the company's learned email pattern,
+    then Hunter. Returns (email, provider), or (None, None).
+    '''
+    handle = extract_linkedin_handle(linkedin_url)
+    h_key = handle_key(handle)
+    n_key = name_key(full_name, company) if full_name and company else None
+
+    # 0. CACHED RESULTS (found emails, or attempts that already came back empty)
+    cached = await email_cache.get([h_key, n_key])
+    email = next((e for e in cached.values() if e), None)
+    if email:
+        logger.info(f"Email served from lookup cache: {email}")
+        return email, "hunter"
+    keys = [k for k in (h_key, n_key) if k]
+    if keys and all(k in cached for k in keys):
+        logger.info("Email lookup served from negative cache: Not found")
+        return None, None
+
+    # 1. LEARNED COMPANY PATTERN (only when it is well established, and
+    #    Hunter has not already come up empty for this name at this company)
+    if full_name and company and n_key not in cached:
+        predicted = await email_patterns.predict(full_name, company)
+        if predicted:
+            email, confidence = predicted
+            logger.info(f"Email inferred from company pattern: {email} (confidence {confidence})")
+            return email, "pattern"
+
+    hunter_key = settings.HUNTER_API_KEY
+    if not hunter_key:
+        return None, None
+
+    # 2. HUNTER ATTEMPTS: LINKEDIN HANDLE, THEN FULL NAME + COMPANY
+    attempts = build_attempts(hunter_key, handle, full_name, company, skip_keys=cached)
+    try:
+        email, missed_keys = await race_attempts(
+            attempts,
+            policy=settings.HUNTER_STRATEGY,
+            hedge_delay=settings.HUNTER_HEDGE_DELAY_MS / 1000,
+            deadline=settings.HUNTER_DEADLINE_MS / 1000
+        )
+    except Exception as e:
+        logger.error(f"Hunter integration error: {e}")
+        logger.error(traceback.format_exc())
+        return None, None
+
+    # Remember the outcome for other users looking up the same person
+    if email:
+        await email_cache.put([h_key, n_key], email)
+        if full_name and company:
+            await email_patterns.learn(full_name, company, email)
+    elif missed_keys:
+        await email_cache.put(missed_keys, None)
+    return email, "hunter" if email else None
+
 @router.post("/find-email")
 async def find_email(
     req: SearchRequest, 
@@ -18,9 +204,13 @@ async def find_email(
     x_extpay_key: str = Header(None)
 ):
     '''
-    Find email address for a given LinkedIn URL or full name and company
+    Find email address for a given LinkedIn URL or full name and company.
+    Duplicate requests already in flight share one lookup and one charge.
     '''
-    
+    key = request_key("find_email", user_id, req, x_extpay_key)
+    return await coalesce(key, _find_email, req, user_id, x_extpay_key)
+
+async def _find_email(req: SearchRequest, user_id: str, x_extpay_key: str = None):
     # Check Usage First
     if not req.skipLog:
         await verify_usage(user_id, x_extpay_key)
@@ -37,76 +227,92 @@ async def find_email(
         logger.warning("DEBUG: Missing search parameters - returning 400")
         raise HTTPException(status_code=400, detail="Missing Search Parameters")
     
-    email = None
-
-    # 1. ATTEMPT 1: HUNTER WITH LINKEDIN HANDLE
-    hunter_key = settings.HUNTER_API_KEY
-    if hunter_key:
-        try:
-            # First attempt parameters
-            params1 = {"api_key": hunter_key}
-            
-            # Extract handle from URL if present
-            handle = None
-            if linkedin_url:
-                parts = [p for p in linkedin_url.split('/') if p]
-                if 'in' in parts:
-                    idx = parts.index('in')
-                    if idx + 1 < len(parts):
-                        handle = parts[idx + 1]
-            
-            if handle:
-                params1["linkedin_handle"] = handle
-                logger.info(f"DEBUG: Attempt 1 - Using LinkedIn Handle: {handle}")
-                
-                logger.info("DEBUG: Calling Hunter.io API (Attempt 1)...")
-                h_res = py_requests.get("https://api.hunter.io/v2/email-finder", params=params1, timeout=10)
-                logger.info(f"DEBUG: Attempt 1 URL: {h_res.url}")
-                logger.info(f"DEBUG: Attempt 1 Response Status: {h_res.status_code}")
-                
-                h_data = h_res.json()
-                if h_data.get("data") and h_data["data"].get("email"):
-                    email = h_data["data"]["email"]
-                    logger.info(f"Hunter found email in Attempt 1: {email}")
-                else:
-                    logger.info("DEBUG: Attempt 1 failed or returned no email.")
-            
-            # 2. ATTEMPT 2: FALLBACK TO FULL NAME + COMPANY
-            if not email and full_name and company:
-                params2 = {
-                    "api_key": hunter_key,
-                    "full_name": full_name,
-                    "company": company
-                }
-                logger.info(f"DEBUG: Attempt 2 - Using Name/Company Search: {full_name} @ {company}")
-                
-                logger.info("DEBUG: Calling Hunter.io API (Attempt 2)...")
-                h_res = py_requests.get("https://api.hunter.io/v2/email-finder", params=params2, timeout=10)
-                logger.info(f"DEBUG: Attempt 2 URL: {h_res.url}")
-                logger.info(f"DEBUG: Attempt 2 Response Status: {h_res.status_code}")
-                
-                h_data = h_res.json()
-                if h_data.get("data") and h_data["data"].get("email"):
-                    email = h_data["data"]["email"]
-                    logger.info(f"Hunter found email in Attempt 2: {email}")
-                else:
-                    logger.info("DEBUG: Attempt 2 failed or returned no email.")
-
-        except Exception as e:
-            logger.error(f"Hunter integration error: {e}")
-            logger.error(traceback.format_exc())
+    email, provider = await lookup_email(linkedin_url, full_name, company)
 
     # Log usage
     if email:
         if not req.skipLog:
             try:
-                supabase.table("usage_logs").insert({
-                    "user_id": user_id,
-                    "action": "find_email"
-                }).execute()
+                await usage_events.record(user_id, "find_email")
             except Exception as log_err:
                 logger.warning(f"Failed to log search usage: {log_err}")
         
-        return {"email": email, "provider": "hunter", "success": True}
+        return {"email": email, "provider": provider, "success": True}
     else:
         return {"email": "Not found", "success": False}
+
+@router.post("/find-email/bulk")
+async def find_emails_bulk(
+    req: BulkSearchRequest,
+    user_id: str = Depends(get_user_id),
+    x_extpay_key: str = Header(None)
+):
+    '''
+    Find emails for many prospects at once. Auth and credits are checked once,
+    lookups run with bounded concurrency, and each result is streamed back as
+    an NDJSON line ({"index", "email", "success"[, "provider" | "error"]}) as
+    soon as it completes. Found emails are charged in one bulk usage write.
+    '''
+
+    if not req.items:
+        raise HTTPException(status_code=400, detail="Missing Search Parameters")
+    if len(req.items) > settings.HUNTER_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Too many prospects. Maximum is {settings.HUNTER_BULK_MAX_ITEMS} per request.")
+
+    # Check Usage Once
+    credits_remaining = None
+    if not req.skipLog:
+        stats = await verify_usage(user_id, x_extpay_key)
+        credits_remaining = stats["creditsRemaining"]
+    else:
+        logger.info(f"[Search] Skipping usage check for user {user_id} (skipLog=True)")
+
+    logger.info(f"[Search] Bulk lookup of {len(req.items)} prospects for user {user_id}")
+    semaphore = asyncio.Semaphore(settings.HUNTER_BULK_CONCURRENCY)
+
+    async def lookup(index: int, item: SearchRequest):
+        if not item.linkedinUrl and not (item.fullName and item.company):
+            return {"index": index, "email": "Not found", "success": False, "error": "Missing Search Parameters"}
+        async with semaphore:
+            email, provider = await lookup_email(item.linkedinUrl, item.fullName, item.company)
+        if email:
+            return {"index": index, "email": email, "provider": provider, "success": True}
+        return {"index": index, "email": "Not found", "success": False}
+
+    async def results():
+        tasks = {asyncio.create_task(lookup(i, item)): i for i, item in enumerate(req.items)}
+        pending = set(tasks)
+        charged = 0
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        logger.error(f"Bulk lookup error: {e}")
+                        result = {"index": tasks[task], "email": "Not found", "success": False, "error": "Lookup failed"}
+                    if result["success"] and credits_remaining is not None:
+                        if charged >= credits_remaining:
+                            result = {"index": result["index"], "email": "Not found", "success": False, "error": "Monthly limit reached"}
+                        else:
+                            charged += 1
+                    yield json.dumps(result) + "\n"
+
+                # Out of credits: stop spending Hunter calls on the rest
+                if credits_remaining is not None and charged >= credits_remaining and pending:
+                    for task in pending:
+                        task.cancel()
+                    for task in pending:
+                        yield json.dumps({"index": tasks[task], "email": "Not found", "success": False, "error": "Monthly limit reached"}) + "\n"
+                    pending = set()
+        finally:
+            for task in pending:
+                task.cancel()
+            if charged and not req.skipLog:
+                try:
+                    await usage_events.record(user_id, "find_email", count=charged)
+                except Exception as log_err:
+                    logger.warning(f"Failed to log bulk search usage: {log_err}")
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
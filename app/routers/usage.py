@@ -1,8 +1,10 @@
 import logging
-import requests as py_requests
 from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException, Header
-from ..core.clients import supabase
+from ..core.clients import get_supabase
+from ..core.extpay import get_user_tier
+from ..core.metrics import upstream_timer
+from ..core.usage_events import usage_events
 from ..core.auth import get_user_id
 
 logger = logging.getLogger(__name__)
@@ -12,6 +14,39 @@ def get_current_month_start_utc():
     now = datetime.now(timezone.utc)
     return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
+def fetch_monthly_count(user_id: str, month_start: datetime) -> int:
+    try:
+        with upstream_timer("supabase", "usage_monthly.select"):
+            counter_res = get_supabase().table("usage_monthly") \
+                .select("count") \
+                .eq("user_id", user_id) \
+                .eq("month_start", month_start.date().isoformat()) \
+                .limit(1) \
+                .execute()
+        return counter_res.data[0]["count"] if counter_res.data else 0
+    except Exception as e:
+        # Counter table unavailable; fall back to counting this month's logs
+        logger.warning(f"[Usage] usage_monthly read failed, counting usage_logs instead: {e}")
+
+    with upstream_timer("supabase", "usage_logs.count"):
+        usage_res = get_supabase().table("usage_logs") \
+            .select("id", count="exact") \
+            .eq("user_id", user_id) \
+            .gte("date_accessed", month_start.isoformat()) \
+            .execute()
+    
+    return usage_res.count if usage_res.count is not None else 0
+
+def reconcile_usage_counters(month_start: datetime = None) -> int:
+    '''
+    Rebuild usage_monthly from usage_logs for one month (all months if None).
+    Returns the number of counter rows written.
+    '''
+    params = {"p_month_start": month_start.date().isoformat() if month_start else None}
+    with upstream_timer("supabase", "rpc.reconcile_usage_monthly"):
+        res = get_supabase().rpc("reconcile_usage_monthly", params).execute()
+    return res.data or 0
+
 @router.get("/status")
 async def get_usage_status(
     user_id: str = Depends(get_user_id),
@@ -23,40 +58,18 @@ async def get_usage_status(
     return await fetch_usage_stats(user_id, x_extpay_key)
 
 async def fetch_usage_stats(user_id: str, extpay_key: str = None):
-    if not supabase:
+    if not get_supabase():
         raise HTTPException(status_code=500, detail="Supabase not configured")
 
     month_start = get_current_month_start_utc()
     
-    # 1. Get User Tier from ExtensionPay (Source of Truth)
-    tier = "free"
+    # 1. Get User Tier from ExtensionPay (Source of Truth, cached with background refresh)
     logger.info(f"[Usage] Fetching stats for user: {user_id}. Key present: {bool(extpay_key)}")
-    
-    if extpay_key:
-        try:
-            # We call ExtensionPay directly to verify the key and get user status
-            # ID is 'sendyai' as confirmed by user
-            logger.info(f"[Usage] Verifying ExtensionPay key: {extpay_key[:8]}...")
-            ep_url = f"https://extensionpay.com/extension/sendyai/api/v2/user?api_key={extpay_key}"
-            response = py_requests.get(ep_url, timeout=5)
-            if response.ok:
-                data = response.json()
-                logger.info(f"[Usage] ExtPay Success. User Paid: {data.get('paidAt') is not None}")
-                if data.get("paidAt"):
-                    tier = "pro"
-            else:
-                logger.warning(f"[Usage] ExtensionPay verification failed: {response.status_code}")
-        except Exception as e:
-            logger.error(f"Error calling ExtensionPay API: {e}")
+    tier = await get_user_tier(extpay_key)
 
-    # 2. Query usage_logs for the current month
-    usage_res = supabase.table("usage_logs") \
-        .select("id", count="exact") \
-        .eq("user_id", user_id) \
-        .gte("date_accessed", month_start.isoformat()) \
-        .execute()
-    
-    count = usage_res.count if usage_res.count is not None else 0
+    # 2. Read this month's usage counter (one row, maintained by a trigger on usage_logs),
+    # plus events still queued for the write-behind logger
+    count = await usage_events.count_usage(user_id, month_start, lambda: fetch_monthly_count(user_id, month_start))
     
     # Tier Limits (monthly)
     limits = {
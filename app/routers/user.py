@@ -1,23 +1,35 @@
 import logging
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Response
 from ..schemas.profile import ProfileUpdate
-from ..core.clients import supabase
+from ..core.clients import get_supabase
 from ..core.auth import get_user_id
+from ..core.metrics import upstream_timer
+from ..core.profiles import get_profile as get_cached_profile, invalidate_profile, profile_etag
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/user", tags=["user"])
 
 @router.get("/profile/me")
-async def get_profile(user_id: str = Depends(get_user_id)):
+async def get_profile(
+    response: Response,
+    user_id: str = Depends(get_user_id),
+    if_none_match: str = Header(None)
+):
     '''
-    Fetch existing user profile from Supabase
+    Fetch existing user profile from Supabase.
+    Supports ETag / If-None-Match: an unchanged profile returns 304.
     '''
-    if not supabase:
+    if not get_supabase():
         raise HTTPException(status_code=500, detail="Supabase not configured")
     try:
-        result = supabase.table("profiles").select("*").eq("id", user_id).single().execute()
-        if result.data:
-            return {"success": True, "profile": result.data}
+        profile = get_cached_profile(user_id)
+        if profile:
+            etag = profile_etag(user_id, profile.get("updated_at"))
+            if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+                return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+            response.headers["ETag"] = etag
+            response.headers["Cache-Control"] = "private, no-cache"
+            return {"success": True, "profile": profile}
         return {"success": False, "profile": None}
     except Exception as e:
         logger.info(f"No existing profile found for {user_id}: {e}")
@@ -29,21 +41,23 @@ async def save_profile(profile: ProfileUpdate, user_id: str = Depends(get_user_i
     Save user profile to Supabase
     '''
 
-    if not supabase:
+    if not get_supabase():
         raise HTTPException(status_code=500, detail="Supabase not configured")
     try:
-        supabase.table("profiles").upsert({
-            "id": user_id,
-            "name": profile.name,
-            "email": profile.email,
-            "university": profile.university,
-            "degree": profile.degree,
-            "experiences": [exp.dict() for exp in profile.experiences],
-            "skills": profile.skills,
-            "total_exp": profile.total_exp,
-            "raw_summary": profile.raw_summary,
-            "updated_at": "now()"
-        }).execute()
+        with upstream_timer("supabase", "profiles.upsert"):
+            get_supabase().table("profiles").upsert({
+                "id": user_id,
+                "name": profile.name,
+                "email": profile.email,
+                "university": profile.university,
+                "degree": profile.degree,
+                "experiences": [exp.dict() for exp in profile.experiences],
+                "skills": profile.skills,
+                "total_exp": profile.total_exp,
+                "raw_summary": profile.raw_summary,
+                "updated_at": "now()"
+            }).execute()
+        invalidate_profile(user_id)
         return {"success": True}
     except Exception as e:
         logger.error(f"Supabase error: {e}")
@@ -20,9 +20,21 @@ class ProfileUpdate(BaseModel):
 
 class OutreachRequest(BaseModel):
     profileData: dict
+    # Skip the cached email for this recipient and write a new one
+    regenerate: Optional[bool] = False
+
+class BulkOutreachRequest(BaseModel):
+    profiles: List[dict]
+    # Submit through the Message Batches API instead of streaming results back
+    lowPriority: Optional[bool] = False
+    regenerate: Optional[bool] = False
 
 class SearchRequest(BaseModel):
     linkedinUrl: Optional[str] = None
     fullName: Optional[str] = None
     company: Optional[str] = None
     skipLog: Optional[bool] = False
+
+class BulkSearchRequest(BaseModel):
+    items: List[SearchRequest]
+    skipLog: Optional[bool] = False
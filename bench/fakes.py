@@ -0,0 +1,442 @@
+'''
+Local stand-ins for every upstream the backend talks to, for benchmarking.
+
+Each fake is a threaded HTTP server with configurable latency (mean plus
+uniform jitter) and error injection (a share of requests answered with a
+5xx). They implement just enough of each API for the routers to work.
+'''
+import json
+import random
+import socketserver
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, unquote
+
+class FakeUpstream:
+    '''
+    Base fake server. Subclasses implement handle(method, path, query, headers, body)
+    returning (status, payload[, extra headers]).
+    '''
+    name = "upstream"
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0, error_status: int = 503):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+        self.errors = 0
+        # Requests by path
+        self.paths = Counter()
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _delay(self):
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def start(self) -> str:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _serve(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                parts = urlsplit(self.path)
+                with fake._lock:
+                    fake.requests += 1
+                    fake.paths[unquote(parts.path)] += 1
+                fake._delay()
+
+                if fake.error_rate and random.random() < fake.error_rate:
+                    with fake._lock:
+                        fake.errors += 1
+                    return self._reply(fake.error_status, {"error": "injected failure"})
+
+                query = parse_qs(parts.query, keep_blank_values=True)
+                result = fake.handle(method, unquote(parts.path), query, self.headers, body)
+                if result is None:
+                    return self._reply(404, {"error": "not found"})
+                if hasattr(result[1], "__next__"):
+                    return self._stream(result[0], result[1])
+                self._reply(*result)
+
+            def _reply(self, status, payload, headers=None):
+                data = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, status, chunks):
+                self.send_response(status)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for chunk in chunks:
+                    self.wfile.write(chunk)
+                    self.wfile.flush()
+                self.close_connection = True
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_HEAD(self):
+                self._serve("HEAD")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def do_PATCH(self):
+                self._serve("PATCH")
+
+            def do_DELETE(self):
+                self._serve("DELETE")
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name=f"fake-{self.name}", daemon=True).start()
+        return self.url
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def handle(self, method, path, query, headers, body):
+        raise NotImplementedError
+
+class FakeGoogle(FakeUpstream):
+    '''
+    /oauth2/v3/userinfo: any bearer token is valid; sub is derived from it.
+    /oauth2/v3/certs: serves `jwks_keys` (public JWKs), empty by default.
+    '''
+    name = "google"
+
+    def __init__(self, jwks_keys: list = None, **kwargs):
+        super().__init__(**kwargs)
+        self.jwks_keys = jwks_keys or []
+
+    def handle(self, method, path, query, headers, body):
+        if path == "/oauth2/v3/userinfo":
+            token = (headers.get("Authorization") or "").replace("Bearer ", "")
+            if not token:
+                return 401, {"error": "invalid_token"}
+            return 200, {"sub": f"sub-{token}", "email": f"{token}@bench.local"}
+        if path == "/oauth2/v3/certs":
+            return 200, {"keys": self.jwks_keys}
+        return None
+
+class FakeHunter(FakeUpstream):
+    '''
+    /v2/email-finder: finds an address for `found_ratio` of lookups.
+    '''
+    name = "hunter"
+
+    def __init__(self, found_ratio: float = 0.8, **kwargs):
+        super().__init__(**kwargs)
+        self.found_ratio = found_ratio
+
+    def handle(self, method, path, query, headers, body):
+        if path != "/v2/email-finder":
+            return None
+        if "linkedin_handle" in query:
+            local = query["linkedin_handle"][0]
+            domain = "linkedin-lookup.example"
+        else:
+            # first.last at every company, so the backend can learn the pattern
+            words = [w for w in query.get("full_name", ["someone"])[0].lower().split() if w.isalpha()] or ["someone"]
+            local = ".".join(words[:1] + words[1:][-1:])
+            domain = query.get("company", ["example"])[0].lower().replace(" ", "") + ".example"
+        # Deterministic per prospect so repeat lookups agree
+        found = (zlib.crc32(local.encode("utf-8")) % 1000) / 1000 < self.found_ratio
+        return 200, {"data": {"email": f"{local}@{domain}" if found else None, "score": 90}}
+
+class FakeExtPay(FakeUpstream):
+    '''
+    /extension/<id>/api/v2/user: keys starting with "pro" are paid.
+    '''
+    name = "extpay"
+
+    def handle(self, method, path, query, headers, body):
+        if not path.startswith("/extension/"):
+            return None
+        key = query.get("api_key", [""])[0]
+        return 200, {"paidAt": "2026-01-01T00:00:00Z" if key.startswith("pro") else None}
+
+class FakeAnthropic(FakeUpstream):
+    '''
+    POST /v1/messages, streaming and non-streaming. Streams `output_words`
+    words, `token_delay_ms` apart, after the base latency.
+
+    Prompt caching is modelled on the system prompt: a prefix marked with
+    cache_control is written on first use and read afterwards, unless it is
+    shorter than the minimum cacheable length (estimated from its characters).
+    '''
+    name = "anthropic"
+
+    CHARS_PER_TOKEN = 4
+    MIN_CACHEABLE_TOKENS = 1024
+
+    RESUME_JSON = json.dumps({
+        "name": "Bench User",
+        "email": "bench@example.com",
+        "university": ["State University"],
+        "degree": ["BSc Computer Science"],
+        "skills": ["Python", "SQL"],
+        "experiences": [{"title": "Intern", "company": "Acme", "start_date": "2025", "end_date": "Present", "description": "Built things"}],
+    })
+
+    def __init__(self, output_words: int = 120, token_delay_ms: float = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.output_words = output_words
+        self.token_delay_ms = token_delay_ms
+        self.cache_read_tokens = 0
+        self._cached_prefixes = set()
+
+    def _cached_prefix(self, request) -> str:
+        system = request.get("system")
+        if not isinstance(system, list):
+            return ""
+        marked = [i for i, block in enumerate(system) if block.get("cache_control")]
+        if not marked:
+            return ""
+        return "".join(block.get("text", "") for block in system[:marked[-1] + 1])
+
+    def _usage(self, request):
+        prefix = self._cached_prefix(request)
+        tokens = len(prefix) // self.CHARS_PER_TOKEN
+        read = write = 0
+        if prefix and tokens >= self.MIN_CACHEABLE_TOKENS:
+            with self._lock:
+                if prefix in self._cached_prefixes:
+                    read = tokens
+                    self.cache_read_tokens += tokens
+                else:
+                    self._cached_prefixes.add(prefix)
+                    write = tokens
+        return {"input_tokens": 900, "output_tokens": self.output_words, "cache_read_input_tokens": read, "cache_creation_input_tokens": write}
+
+    def _text(self, request):
+        system = json.dumps(request.get("system", ""))
+        if "resume parser" in system:
+            return self.RESUME_JSON
+        return "Reaching Out\n\nHi there,\n\n" + " ".join(["word"] * self.output_words) + "\n\nBest,\nBench"
+
+    def handle(self, method, path, query, headers, body):
+        if method != "POST" or path != "/v1/messages":
+            return None
+        request = json.loads(body or b"{}")
+        text = self._text(request)
+        message = {
+            "id": f"msg_{uuid.uuid4().hex[:12]}",
+            "type": "message",
+            "role": "assistant",
+            "model": request.get("model", "bench"),
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": self._usage(request),
+        }
+        if not request.get("stream"):
+            if self.token_delay_ms:
+                time.sleep(self.token_delay_ms * self.output_words / 1000)
+            return 200, message
+        return 200, self._events(message, text)
+
+    def _events(self, message, text):
+        def event(name, data):
+            return f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+        start = dict(message, content=[], usage=dict(message["usage"], output_tokens=0))
+        yield event("message_start", {"type": "message_start", "message": start})
+        yield event("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+        for word in text.split(" "):
+            if self.token_delay_ms:
+                time.sleep(self.token_delay_ms / 1000)
+            yield event("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": word + " "}})
+        yield event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        yield event("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": self.output_words}})
+        yield event("message_stop", {"type": "message_stop"})
+
+class FakePostgREST(FakeUpstream):
+    '''
+    In-memory PostgREST stand-in for the Supabase tables the backend uses:
+    eq./in./gt./gte. filters, select, limit, count=exact, upsert and rpc.
+    '''
+    name = "supabase"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.tables = {}
+        self._data_lock = threading.Lock()
+
+    def seed_profile(self, user_id: str, **fields):
+        row = {
+            "id": user_id,
+            "name": "Bench Sender",
+            "email": f"{user_id}@bench.local",
+            "university": ["State University"],
+            "degree": ["BSc"],
+            "experiences": [],
+            "skills": ["Python", "Finance"],
+            "total_exp": 1,
+            "raw_summary": "Junior studying computer science, interested in fintech.",
+            "updated_at": "2026-01-01T00:00:00+00:00",
+        }
+        row.update(fields)
+        self.tables.setdefault("profiles", {})[user_id] = row
+
+    @staticmethod
+    def _matches(row, filters):
+        for column, expr in filters:
+            op, _, value = expr.partition(".")
+            current = row.get(column)
+            if op == "eq" and str(current) != value:
+                return False
+            if op == "in" and str(current) not in value.strip("()").replace('"', "").split(","):
+                return False
+            if op in ("gt", "gte") and current is not None and str(current) < value:
+                return False
+        return True
+
+    def handle(self, method, path, query, headers, body):
+        if not path.startswith("/rest/v1/"):
+            return None
+        name = path[len("/rest/v1/"):]
+
+        if name.startswith("rpc/"):
+            return 200, 0
+
+        if method in ("GET", "HEAD"):
+            filters = [(k, v[0]) for k, v in query.items() if k not in ("select", "limit", "offset", "order")]
+            with self._data_lock:
+                rows = [r for r in self.tables.get(name, {}).values() if self._matches(r, filters)]
+            total = len(rows)
+            if "limit" in query:
+                rows = rows[:int(query["limit"][0])]
+            select = query.get("select", ["*"])[0]
+            if select != "*":
+                columns = [c.strip() for c in select.split(",")]
+                rows = [{c: r.get(c) for c in columns} for r in rows]
+            extra = {}
+            if "count=exact" in (headers.get("Prefer") or ""):
+                extra["Content-Range"] = f"0-{max(total - 1, 0)}/{total}"
+            return 200, rows, extra
+
+        if method == "POST":
+            payload = json.loads(body or b"[]")
+            rows = payload if isinstance(payload, list) else [payload]
+            key = {"profiles": "id", "email_lookup_cache": "key", "usage_logs": "event_id", "outreach_batches": "batch_id"}.get(name, "id")
+            with self._data_lock:
+                table = self.tables.setdefault(name, {})
+                for row in rows:
+                    table[row.get(key) or uuid.uuid4().hex] = row
+            return 201, rows
+
+        return None
+
+class FakeSMTP(FakeUpstream):
+    '''
+    Plain SMTP relay (no TLS, no auth) that keeps received messages in
+    `messages`. Injected errors answer DATA with a 451.
+    '''
+    name = "smtp"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.messages = []
+        self.connections = 0
+
+    def start(self) -> str:
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+            def handle(self):
+                with fake._lock:
+                    fake.connections += 1
+                self.reply("220 fake-smtp ready")
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode("utf-8", "replace").strip().upper()
+                    if command.startswith(("EHLO", "HELO")):
+                        self.reply("250 fake-smtp")
+                    elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                        self.reply("250 OK")
+                    elif command == "DATA":
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        data = []
+                        for raw in self.rfile:
+                            if raw in (b".\r\n", b".\n"):
+                                break
+                            data.append(raw[1:] if raw.startswith(b"..") else raw)
+                        with fake._lock:
+                            fake.requests += 1
+                        fake._delay()
+                        if fake.error_rate and random.random() < fake.error_rate:
+                            with fake._lock:
+                                fake.errors += 1
+                            self.reply("451 Injected failure")
+                            continue
+                        with fake._lock:
+                            fake.messages.append(b"".join(data).decode("utf-8", "replace"))
+                        self.reply("250 Queued")
+                    elif command == "QUIT":
+                        self.reply("221 Bye")
+                        return
+                    else:
+                        self.reply("502 Not implemented")
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name=f"fake-{self.name}", daemon=True).start()
+        return self.url
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"smtp://127.0.0.1:{self.port}"
+
+def start_all(latency_ms: dict = None, error_rate: dict = None, **options) -> dict:
+    '''
+    Start one fake per upstream. latency_ms / error_rate map upstream name
+    to a value; options are passed to the fake of the same name.
+    '''
+    latency_ms = latency_ms or {}
+    error_rate = error_rate or {}
+    fakes = {}
+    for cls in (FakeGoogle, FakeHunter, FakeExtPay, FakeAnthropic, FakePostgREST, FakeSMTP):
+        fake = cls(
+            latency_ms=latency_ms.get(cls.name, 0),
+            jitter_ms=latency_ms.get(cls.name, 0) * 0.2,
+            error_rate=error_rate.get(cls.name, 0),
+            **options.get(cls.name, {})
+        )
+        fake.start()
+        fakes[cls.name] = fake
+    return fakes
@@ -0,0 +1,110 @@
+'''
+Resume fixtures for /onboarding/parse, generated in code so the repo does not
+carry binary files. make_pdf writes a minimal text PDF (readable by pdfplumber)
+and make_docx a minimal Word document (readable by python-docx).
+'''
+import io
+import random
+import zipfile
+from xml.sax.saxutils import escape
+
+FIRST_NAMES = ["Alex", "Jordan", "Taylor", "Morgan", "Casey", "Riley", "Avery", "Quinn"]
+LAST_NAMES = ["Chen", "Patel", "Garcia", "Smith", "Okafor", "Kim", "Novak", "Silva"]
+COMPANIES = ["Goldman Sachs", "McKinsey", "Stripe", "Jane Street", "Bain", "Google", "Citadel", "Deloitte"]
+SCHOOLS = ["State University", "Tech Institute", "City College", "Northern University"]
+
+def resume_lines(seed: int, roles: int = 4) -> list:
+    rng = random.Random(seed)
+    lines = [
+        f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        f"bench{seed}@example.com",
+        "EDUCATION",
+        f"{rng.choice(SCHOOLS)} - BSc Economics, expected 2027",
+        "EXPERIENCE",
+    ]
+    for i in range(roles):
+        lines.append(f"Analyst Intern, {rng.choice(COMPANIES)} (Summer {2022 + i})")
+        lines.append("Built financial models and presented findings to senior staff.")
+    lines += ["SKILLS", "Python, SQL, Excel, Financial Modeling"]
+    return lines
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def make_pdf(pages: list) -> bytes:
+    '''
+    PDF with one page per entry of `pages` (each a list of text lines).
+    '''
+    n = len(pages)
+    # 1 catalog, 2 page tree, 3 font, then a page/content pair per page
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(n))
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {n} >>",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, lines in enumerate(pages):
+        content = "BT /F1 11 Tf 72 740 Td 14 TL " + " ".join(f"({_pdf_escape(line)}) Tj T*" for line in lines) + " ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += b"".join(f"{offset:010d} 00000 n \n".encode("latin-1") for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return out
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+def make_docx(paragraphs: list) -> bytes:
+    body = "".join(f"<w:p><w:r><w:t xml:space=\"preserve\">{escape(p)}</w:t></w:r></w:p>" for p in paragraphs)
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f"<w:body>{body}</w:body></w:document>"
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        archive.writestr("_rels/.rels", _RELS)
+        archive.writestr("word/document.xml", document)
+    return buffer.getvalue()
+
+def resume_fixtures(count: int, pages: int = 2) -> list:
+    '''
+    `count` distinct resumes as (filename, bytes, content type), alternating
+    PDF and DOCX.
+    '''
+    fixtures = []
+    for seed in range(count):
+        if seed % 2 == 0:
+            data = make_pdf([resume_lines(seed * 100 + page) for page in range(pages)])
+            fixtures.append((f"resume-{seed}.pdf", data, "application/pdf"))
+        else:
+            data = make_docx(resume_lines(seed))
+            fixtures.append((f"resume-{seed}.docx", data, "application/vnd.openxmlformats-officedocument.wordprocessingml.document"))
+    return fixtures
@@ -0,0 +1,268 @@
+'''
+Benchmark the backend against local fake upstreams.
+
+    python -m bench.run --duration 30 --concurrency 32 \
+        --mix find_email=5,outreach=2,parse=1,usage=3 \
+        --latency hunter=250,anthropic=1500,supabase=15 --error-rate hunter=0.02 \
+        --json results.json --compare baseline.json
+
+The app runs in-process under uvicorn, with every upstream (Google userinfo,
+Hunter, ExtensionPay, Anthropic, Supabase/PostgREST, SMTP) pointed at the fakes in
+bench/fakes.py. Reports throughput and p50/p95/p99 latency per endpoint.
+'''
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from .fakes import start_all
+from .fixtures import resume_fixtures, FIRST_NAMES, LAST_NAMES, COMPANIES
+
+ENDPOINTS = ("find_email", "outreach", "parse", "usage", "contact")
+
+def _parse_map(value: str, cast=float) -> dict:
+    result = {}
+    for item in filter(None, (value or "").split(",")):
+        key, _, raw = item.partition("=")
+        result[key.strip()] = cast(raw)
+    return result
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def configure_environment(fakes: dict, workdir: str):
+    # Must run before the app is imported: Settings and clients read these at import
+    os.environ.update({
+        "SUPABASE_URL": fakes["supabase"].url,
+        "SUPABASE_KEY": "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.bench",
+        "ANTHROPIC_API_KEY": "sk-bench",
+        "ANTHROPIC_BASE_URL": fakes["anthropic"].url,
+        "GOOGLE_API_BASE": fakes["google"].url,
+        "HUNTER_API_BASE": fakes["hunter"].url,
+        "HUNTER_API_KEY": "bench",
+        "EXTPAY_API_BASE": fakes["extpay"].url,
+        "EMAIL_CACHE_PATH": os.path.join(workdir, "email_cache.sqlite3"),
+        "USAGE_SPOOL_DIR": os.path.join(workdir, "usage_spool"),
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(fakes["smtp"].port),
+        "SMTP_SSL": "false",
+        "SMTP_AUTH": "false",
+        "CONTACT_SPOOL_DIR": os.path.join(workdir, "contact_spool"),
+    })
+
+def start_app(port: int, log_path: str, log_level: str):
+    import uvicorn
+    from app.main import app
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.FileHandler(log_path)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root.addHandler(handler)
+    root.setLevel(log_level)
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False, lifespan="on")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, name="bench-app", daemon=True)
+    thread.start()
+    deadline = time.time() + 30
+    while not server.started:
+        if time.time() > deadline or not thread.is_alive():
+            raise RuntimeError("App failed to start; see the app log")
+        time.sleep(0.05)
+    return server, thread
+
+class Workload:
+    '''
+    Builds requests for each endpoint from fixed pools of users, prospects and
+    resumes, so cache hit ratios stay realistic rather than all-hit or all-miss.
+    '''
+
+    def __init__(self, args):
+        self.rng = random.Random(args.seed)
+        self.users = [f"bench{u}" for u in range(args.users)]
+        self.prospects = [
+            {
+                "fullName": f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)} {i}",
+                "company": self.rng.choice(COMPANIES),
+            }
+            for i in range(args.prospects)
+        ]
+        self.resumes = resume_fixtures(args.resumes)
+
+    def headers(self, user: str) -> dict:
+        return {"Authorization": f"Bearer {user}", "x-extpay-key": f"pro-{user}"}
+
+    def request(self, endpoint: str) -> dict:
+        user = self.rng.choice(self.users)
+        prospect = self.rng.choice(self.prospects)
+        if endpoint == "find_email":
+            return {"method": "POST", "url": "/api/find-email", "json": prospect, "headers": self.headers(user)}
+        if endpoint == "outreach":
+            recipient = {
+                "name": prospect["fullName"],
+                "headline": f"Associate at {prospect['company']}",
+                "experience": [{"title": "Associate", "company": prospect["company"], "dates": "2023 - Present"}],
+                "education": [{"school": "State University", "degree": "BA Economics", "dates": "2019 - 2023"}],
+                "honors": [],
+            }
+            return {"method": "POST", "url": "/outreach/generate", "json": {"profileData": recipient}, "headers": self.headers(user)}
+        if endpoint == "parse":
+            name, data, content_type = self.rng.choice(self.resumes)
+            return {"method": "POST", "url": "/onboarding/parse", "files": {"file": (name, data, content_type)}, "headers": self.headers(user)}
+        if endpoint == "usage":
+            return {"method": "GET", "url": "/usage/status", "headers": self.headers(user)}
+        if endpoint == "contact":
+            body = {"name": prospect["fullName"], "email": f"{user}@bench.local", "message": "Hello from the benchmark."}
+            return {"method": "POST", "url": "/contact", "json": body}
+        raise ValueError(endpoint)
+
+async def drive(base_url: str, args, workload: Workload) -> dict:
+    import httpx
+
+    mix = _parse_map(args.mix)
+    endpoints = [e for e in ENDPOINTS if mix.get(e, 0) > 0]
+    weights = [mix[e] for e in endpoints]
+    results = {e: {"latencies": [], "errors": 0, "statuses": {}} for e in endpoints}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        async def worker(stop_at: float, record: bool):
+            while time.perf_counter() < stop_at:
+                endpoint = workload.rng.choices(endpoints, weights)[0]
+                spec = workload.request(endpoint)
+                started = time.perf_counter()
+                try:
+                    response = await client.request(**spec)
+                    status = response.status_code
+                except Exception:
+                    status = "exception"
+                elapsed = time.perf_counter() - started
+                if not record:
+                    continue
+                bucket = results[endpoint]
+                bucket["latencies"].append(elapsed)
+                bucket["statuses"][str(status)] = bucket["statuses"].get(str(status), 0) + 1
+                if status == "exception" or status >= 400:
+                    bucket["errors"] += 1
+
+        if args.warmup:
+            stop_at = time.perf_counter() + args.warmup
+            await asyncio.gather(*[worker(stop_at, False) for _ in range(args.concurrency)])
+
+        started = time.perf_counter()
+        stop_at = started + args.duration
+        await asyncio.gather(*[worker(stop_at, True) for _ in range(args.concurrency)])
+        wall = time.perf_counter() - started
+
+    report = {"duration_s": round(wall, 2), "concurrency": args.concurrency, "endpoints": {}}
+    total = 0
+    for endpoint, bucket in results.items():
+        latencies = sorted(bucket["latencies"])
+        total += len(latencies)
+        report["endpoints"][endpoint] = {
+            "requests": len(latencies),
+            "errors": bucket["errors"],
+            "rps": round(len(latencies) / wall, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            "max_ms": round((latencies[-1] if latencies else 0) * 1000, 1),
+            "statuses": bucket["statuses"],
+        }
+    report["total_rps"] = round(total / wall, 2)
+    return report
+
+def format_report(report: dict, baseline: dict = None) -> str:
+    lines = [
+        f"Duration: {report['duration_s']}s  Concurrency: {report['concurrency']}  Throughput: {report['total_rps']} req/s",
+        "",
+        f"{'endpoint':<12}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}",
+    ]
+    for endpoint, row in report["endpoints"].items():
+        lines.append(
+            f"{endpoint:<12}{row['requests']:>10}{row['errors']:>8}{row['rps']:>10}"
+            f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}"
+        )
+        old = (baseline or {}).get("endpoints", {}).get(endpoint)
+        if old:
+            def delta(key):
+                return f"{(row[key] - old[key]) / old[key] * 100:+.0f}%" if old[key] else "n/a"
+            lines.append(
+                f"{'  vs base':<12}{'':>10}{'':>8}{delta('rps'):>10}"
+                f"{delta('p50_ms'):>10}{delta('p95_ms'):>10}{delta('p99_ms'):>10}{delta('max_ms'):>10}"
+            )
+    lines.append("")
+    lines.append("Upstream calls: " + ", ".join(f"{name}={count}" for name, count in report.get("upstream_requests", {}).items()))
+    lines.append(f"Prompt cache reads: {report.get('prompt_cache_read_tokens', 0)} tokens")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Sendy backend against local fake upstreams.")
+    parser.add_argument("--duration", type=float, default=20, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="Unmeasured seconds before the run")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mix", default="find_email=5,outreach=2,parse=1,usage=3", help="Endpoint weights")
+    parser.add_argument("--latency", default="google=40,hunter=250,extpay=120,anthropic=1200,supabase=15",
+                        help="Mean upstream latency in ms, per upstream")
+    parser.add_argument("--error-rate", default="", help="Share of 5xx answers per upstream, e.g. hunter=0.05")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--prospects", type=int, default=500)
+    parser.add_argument("--resumes", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--log-level", default="INFO", help="App log level (logs go to a file)")
+    parser.add_argument("--json", help="Write the report as JSON to this path")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="sendy-bench-")
+    fakes = start_all(latency_ms=_parse_map(args.latency), error_rate=_parse_map(args.error_rate))
+    configure_environment(fakes, workdir)
+    workload = Workload(args)
+    for user in workload.users:
+        fakes["supabase"].seed_profile(f"sub-{user}")
+
+    log_path = os.path.join(workdir, "app.log")
+    port = _free_port()
+    server, thread = start_app(port, log_path, args.log_level)
+    print(f"App on http://127.0.0.1:{port}, logs in {log_path}", file=sys.stderr)
+
+    try:
+        report = asyncio.run(drive(f"http://127.0.0.1:{port}", args, workload))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=15)
+        for fake in fakes.values():
+            fake.stop()
+
+    report["upstream_requests"] = {name: fake.requests for name, fake in fakes.items()}
+    report["prompt_cache_read_tokens"] = fakes["anthropic"].cache_read_tokens
+    report["settings"] = {"mix": args.mix, "latency": args.latency, "error_rate": args.error_rate}
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print(format_report(report, baseline))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
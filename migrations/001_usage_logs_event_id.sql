@@ -0,0 +1,15 @@
+-- Existing databases: add the column the write-behind usage logger upserts on
+-- (app/core/usage_events.py). Run before deploying it; until the column exists
+-- every flush fails and usage events stay queued and spooled.
+ALTER TABLE usage_logs ADD COLUMN IF NOT EXISTS event_id UUID;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'usage_logs_event_id_key') THEN
+        ALTER TABLE usage_logs ADD CONSTRAINT usage_logs_event_id_key UNIQUE (event_id);
+    END IF;
+END;
+$$;
+
+-- Let PostgREST see the new column without a restart
+NOTIFY pgrst, 'reload schema';
@@ -15,8 +15,106 @@ CREATE TABLE usage_logs (
     id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
     user_id TEXT REFERENCES profiles(id),
     action TEXT DEFAULT 'generate_email',
-    date_accessed TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()) NOT NULL
+    date_accessed TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()) NOT NULL,
+    -- Set by the write-behind logger so replayed events are inserted once.
+    -- Existing databases: apply migrations/001_usage_logs_event_id.sql
+    event_id UUID UNIQUE
+);
+
+-- Credit checks filter usage_logs by user and month
+CREATE INDEX usage_logs_user_date_idx ON usage_logs (user_id, date_accessed);
+
+-- Per-user, per-month usage counters (UTC months), kept in step with usage_logs
+-- by a trigger so credit checks read one row instead of counting logs.
+-- After creating it on an existing database, backfill once with
+-- `python -m app.jobs.reconcile_usage --all`.
+CREATE TABLE usage_monthly (
+    user_id TEXT NOT NULL,
+    month_start DATE NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, month_start)
+);
+
+CREATE OR REPLACE FUNCTION bump_usage_monthly() RETURNS TRIGGER
+LANGUAGE plpgsql SECURITY DEFINER AS $$
+BEGIN
+    INSERT INTO usage_monthly (user_id, month_start, count)
+    VALUES (NEW.user_id, date_trunc('month', NEW.date_accessed AT TIME ZONE 'utc')::date, 1)
+    ON CONFLICT (user_id, month_start) DO UPDATE SET count = usage_monthly.count + 1;
+    RETURN NEW;
+END;
+$$;
+
+CREATE TRIGGER usage_logs_bump_monthly
+    AFTER INSERT ON usage_logs
+    FOR EACH ROW EXECUTE FUNCTION bump_usage_monthly();
+
+-- Rebuild counters from usage_logs for one month (or every month when NULL).
+-- Run by app/jobs/reconcile_usage.py; returns the number of counter rows written.
+CREATE OR REPLACE FUNCTION reconcile_usage_monthly(p_month_start DATE DEFAULT NULL) RETURNS INTEGER
+LANGUAGE plpgsql SECURITY DEFINER AS $$
+DECLARE
+    written INTEGER;
+BEGIN
+    -- Block trigger updates while the month is rebuilt
+    LOCK TABLE usage_monthly IN SHARE ROW EXCLUSIVE MODE;
+
+    DELETE FROM usage_monthly
+    WHERE p_month_start IS NULL OR month_start = p_month_start;
+
+    INSERT INTO usage_monthly (user_id, month_start, count)
+    SELECT user_id, date_trunc('month', date_accessed AT TIME ZONE 'utc')::date, count(*)
+    FROM usage_logs
+    WHERE user_id IS NOT NULL
+      AND (p_month_start IS NULL OR (
+          date_accessed >= p_month_start::timestamp AT TIME ZONE 'utc'
+          AND date_accessed < (p_month_start + INTERVAL '1 month') AT TIME ZONE 'utc'
+      ))
+    GROUP BY 1, 2;
+
+    GET DIAGNOSTICS written = ROW_COUNT;
+    RETURN written;
+END;
+$$;
+
+-- Email-finder results shared across workers (EMAIL_CACHE_BACKEND=supabase).
+-- key is "handle:<linkedin handle>" or "name:<full name>|<company>"; a NULL email means "Not found".
+CREATE TABLE email_lookup_cache (
+    key TEXT PRIMARY KEY,
+    email TEXT,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+-- Email address patterns learned from Hunter results, per normalized company name
+-- (see app/core/email_patterns.py). pattern is e.g. "first.last" or "flast".
+CREATE TABLE email_patterns (
+    company TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    pattern TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (company, domain, pattern)
+);
+
+CREATE OR REPLACE FUNCTION record_email_pattern(p_company TEXT, p_domain TEXT, p_pattern TEXT) RETURNS VOID
+LANGUAGE sql SECURITY DEFINER AS $$
+    INSERT INTO email_patterns (company, domain, pattern, hits, updated_at)
+    VALUES (p_company, p_domain, p_pattern, 1, NOW())
+    ON CONFLICT (company, domain, pattern)
+    DO UPDATE SET hits = email_patterns.hits + 1, updated_at = NOW();
+$$;
+
+-- Low-priority outreach batches (Anthropic Message Batches) and who submitted them;
+-- GET /outreach/batch/{id} only answers the submitter.
+CREATE TABLE outreach_batches (
+    batch_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
 ALTER TABLE profiles ENABLE ROW LEVEL SECURITY;
 ALTER TABLE usage_logs ENABLE ROW LEVEL SECURITY;
+ALTER TABLE usage_monthly ENABLE ROW LEVEL SECURITY;
+ALTER TABLE email_lookup_cache ENABLE ROW LEVEL SECURITY;
+ALTER TABLE email_patterns ENABLE ROW LEVEL SECURITY;
+ALTER TABLE outreach_batches ENABLE ROW LEVEL SECURITY;
@@ -0,0 +1,46 @@
+'''
+Settings, the upstream clients and the JWKS cache read the environment once,
+at import, so it is set here before any test module imports the app. Google
+is a local fake serving a freshly generated signing key; nothing leaves the
+machine.
+'''
+import json
+import os
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+from bench.fakes import FakeGoogle
+
+GOOGLE_CLIENT_ID = "test-client.apps.googleusercontent.com"
+GOOGLE_KID = "test-key"
+
+def new_signing_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+_signing_key = new_signing_key()
+_jwk = json.loads(RSAAlgorithm.to_jwk(_signing_key.public_key()))
+_jwk.update({"kid": GOOGLE_KID, "alg": "RS256", "use": "sig"})
+_google = FakeGoogle(jwks_keys=[_jwk])
+_google.start()
+
+os.environ.update({
+    "SUPABASE_URL": "http://127.0.0.1:9",
+    "SUPABASE_KEY": "test",
+    "ANTHROPIC_API_KEY": "test",
+    "GOOGLE_API_BASE": _google.url,
+    "GOOGLE_CLIENT_ID": GOOGLE_CLIENT_ID,
+    "GOOGLE_JWKS_URL": f"{_google.url}/oauth2/v3/certs",
+    # No lookup cache file in the temp dir
+    "EMAIL_CACHE_BACKEND": "none",
+})
+
+def pytest_unconfigure(config):
+    _google.stop()
+
+@pytest.fixture(scope="session")
+def google():
+    return _google
+
+@pytest.fixture(scope="session")
+def signing_key():
+    return _signing_key
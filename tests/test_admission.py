@@ -0,0 +1,87 @@
+'''
+Slot hand-off in app/core/admission.py (RouteClassLimiter): FIFO order, and
+no slot leaked when a waiter times out or is cancelled just as it is
+handed one.
+'''
+import asyncio
+import pytest
+from app.core import admission
+from app.core.admission import RouteClassLimiter
+
+@pytest.fixture
+def limiter():
+    return RouteClassLimiter("test", limit=1, user_rate=0, user_burst=0)
+
+def test_released_slot_goes_to_the_oldest_waiter(limiter):
+    async def go():
+        assert await limiter.acquire(1)
+        order = []
+
+        async def wait(name):
+            if await limiter.acquire(1):
+                order.append(name)
+                limiter.release()
+
+        waiters = [asyncio.create_task(wait(name)) for name in ("first", "second")]
+        await asyncio.sleep(0)
+        # A newcomer queues behind them rather than taking the slot
+        waiters.append(asyncio.create_task(wait("newcomer")))
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.gather(*waiters)
+        return order
+
+    assert asyncio.run(go()) == ["first", "second", "newcomer"]
+    assert limiter.in_flight == 0
+
+def test_timeout_without_a_slot(limiter):
+    async def go():
+        assert await limiter.acquire(1)
+        return await limiter.acquire(0.01)
+
+    assert asyncio.run(go()) is False
+    assert (limiter.in_flight, limiter.stats()["waiting"]) == (1, 0)
+
+@pytest.fixture
+def handed_over_then(limiter, monkeypatch):
+    '''
+    Makes the next wait end with the given exception just after the holder
+    hands that waiter its slot, as wait_for allows on Python 3.12+.
+    '''
+    def arm(exc):
+        wait_for = asyncio.wait_for
+
+        async def release_then_raise(waiter, timeout):
+            monkeypatch.setattr(admission.asyncio, "wait_for", wait_for)
+            # Lets anyone else queue up behind this waiter first
+            await asyncio.sleep(0.01)
+            limiter.release()
+            raise exc
+
+        monkeypatch.setattr(admission.asyncio, "wait_for", release_then_raise)
+    return arm
+
+def test_slot_handed_over_as_the_wait_times_out_is_returned(limiter, handed_over_then):
+    async def go():
+        assert await limiter.acquire(1)
+        handed_over_then(asyncio.TimeoutError)
+        timed_out = await limiter.acquire(1)
+        # The slot is free again, not leaked to the waiter that left
+        return timed_out, await limiter.acquire(0.01)
+
+    assert asyncio.run(go()) == (False, True)
+    assert (limiter.in_flight, limiter.stats()["waiting"]) == (1, 0)
+
+def test_slot_handed_over_as_the_waiter_is_cancelled_passes_on(limiter, handed_over_then):
+    async def go():
+        assert await limiter.acquire(1)
+        handed_over_then(asyncio.CancelledError)
+        leaving = asyncio.create_task(limiter.acquire(1))
+        await asyncio.sleep(0)
+        staying = asyncio.create_task(limiter.acquire(1))
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+        return await staying
+
+    assert asyncio.run(go()) is True
+    assert (limiter.in_flight, limiter.stats()["waiting"]) == (1, 0)
@@ -0,0 +1,62 @@
+'''
+Local Google ID-token verification (app/core/auth.py) against a stub JWKS
+endpoint serving a freshly generated RSA key. Runs offline.
+'''
+import asyncio
+import time
+import jwt
+import pytest
+from tests.conftest import GOOGLE_CLIENT_ID as CLIENT_ID, GOOGLE_KID as KID, new_signing_key
+
+@pytest.fixture(scope="module")
+def auth():
+    from app.core import auth
+    return auth
+
+def run(coro):
+    async def with_clients():
+        from app.core.clients import close_http_clients
+        try:
+            return await coro
+        finally:
+            # Pooled clients are bound to this event loop
+            await close_http_clients()
+    return asyncio.run(with_clients())
+
+def make_token(key, **overrides):
+    now = int(time.time())
+    claims = {
+        "iss": "https://accounts.google.com",
+        "aud": CLIENT_ID,
+        "sub": "1234567890",
+        "iat": now,
+        "exp": now + 3600,
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, key, algorithm="RS256", headers={"kid": KID})
+
+def test_valid_token_is_accepted(auth, signing_key):
+    claims = run(auth._verify_id_token(make_token(signing_key)))
+    assert claims["sub"] == "1234567890"
+
+def test_get_user_id_verifies_locally(auth, google, signing_key):
+    userinfo_calls = google.paths["/oauth2/v3/userinfo"]
+    user_id = run(auth.get_user_id(f"Bearer {make_token(signing_key, sub='local-user')}"))
+    assert user_id == "local-user"
+    assert google.paths["/oauth2/v3/userinfo"] == userinfo_calls
+
+@pytest.mark.parametrize("overrides", [
+    {"aud": "someone-else.apps.googleusercontent.com"},
+    {"iss": "https://evil.example.com"},
+    {"exp": int(time.time()) - 60},
+])
+def test_bad_claims_are_rejected(auth, signing_key, overrides):
+    assert run(auth._verify_id_token(make_token(signing_key, **overrides))) is None
+
+def test_wrong_signing_key_is_rejected(auth):
+    assert run(auth._verify_id_token(make_token(new_signing_key()))) is None
+
+def test_unsigned_token_is_rejected(auth):
+    token = jwt.encode({"iss": "https://accounts.google.com", "aud": CLIENT_ID, "sub": "x", "exp": int(time.time()) + 60},
+                       None, algorithm="none", headers={"kid": KID})
+    assert run(auth._verify_id_token(token)) is None
@@ -0,0 +1,79 @@
+'''
+Hunter attempt strategies in app/routers/search.py (race_attempts), with
+run_attempt replaced by scripted attempts so no request leaves the process.
+'''
+import asyncio
+import pytest
+from app.routers import search
+
+def attempt(key, delay, email=None, answered=True):
+    return {"name": key, "key": key, "delay": delay, "email": email, "answered": answered}
+
+@pytest.fixture
+def log(monkeypatch):
+    '''
+    Events ("start"/"end"/"cancel", key, time) from the scripted attempts.
+    '''
+    events = []
+
+    async def run_attempt(a):
+        loop = asyncio.get_running_loop()
+        events.append(("start", a["key"], loop.time()))
+        try:
+            await asyncio.sleep(a["delay"])
+        except asyncio.CancelledError:
+            events.append(("cancel", a["key"], loop.time()))
+            raise
+        events.append(("end", a["key"], loop.time()))
+        return a["email"], a["answered"]
+
+    monkeypatch.setattr(search, "run_attempt", run_attempt)
+    return events
+
+def race(attempts, **kwargs):
+    async def go():
+        result = await search.race_attempts(attempts, **kwargs)
+        # Let cancelled attempts record their cancellation
+        await asyncio.sleep(0)
+        return result
+    return asyncio.run(go())
+
+def kinds(log, key):
+    return [kind for kind, k, _ in log if k == key]
+
+def test_serial_runs_one_attempt_at_a_time(log):
+    email, missed = race([attempt("handle", 0.02), attempt("name", 0.02, "a@x.com")], policy="serial")
+    assert (email, missed) == ("a@x.com", ["handle"])
+    assert [(kind, key) for kind, key, _ in log] == [
+        ("start", "handle"), ("end", "handle"), ("start", "name"), ("end", "name"),
+    ]
+
+def test_serial_does_not_cache_unanswered_misses(log):
+    email, missed = race([attempt("handle", 0, answered=False), attempt("name", 0)], policy="serial")
+    assert (email, missed) == (None, ["name"])
+
+def test_parallel_starts_everything_and_cancels_losers(log):
+    email, missed = race([attempt("handle", 0.01, "a@x.com"), attempt("name", 5)], policy="parallel")
+    assert (email, missed) == ("a@x.com", [])
+    assert kinds(log, "name") == ["start", "cancel"]
+    starts = [t for kind, _, t in log if kind == "start"]
+    assert max(starts) - min(starts) < 0.01
+
+def test_hedged_starts_next_attempt_after_hedge_delay(log):
+    email, missed = race([attempt("handle", 5), attempt("name", 0.01, "b@x.com")], policy="hedged", hedge_delay=0.05)
+    assert (email, missed) == ("b@x.com", [])
+    assert kinds(log, "handle") == ["start", "cancel"]
+    (handle_start,) = [t for kind, key, t in log if (kind, key) == ("start", "handle")]
+    (name_start,) = [t for kind, key, t in log if (kind, key) == ("start", "name")]
+    # Event loop timers may fire up to a clock tick early
+    assert name_start - handle_start >= 0.04
+
+def test_hedged_starts_next_attempt_early_on_a_miss(log):
+    email, missed = race([attempt("handle", 0.01), attempt("name", 0.01, "b@x.com")], policy="hedged", hedge_delay=5)
+    assert (email, missed) == ("b@x.com", ["handle"])
+
+def test_deadline_cancels_everything_still_running(log):
+    email, missed = race([attempt("handle", 5), attempt("name", 5)], policy="parallel", deadline=0.05)
+    assert (email, missed) == (None, [])
+    assert kinds(log, "handle") == ["start", "cancel"]
+    assert kinds(log, "name") == ["start", "cancel"]
@@ -0,0 +1,145 @@
+'''
+Write-behind usage logging (app/core/usage_events.py): spool replay after a
+crash and usage counts while events are queued or mid-flush. A dict stands
+in for usage_logs, with the same upsert-on-event_id semantics.
+'''
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+from postgrest.exceptions import APIError
+from app.core.config import settings
+from app.core.usage_events import UsageEventPipeline
+
+SINCE = datetime.now(timezone.utc) - timedelta(days=1)
+
+@pytest.fixture(autouse=True)
+def write_behind(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "USAGE_WRITE_BEHIND", True)
+    monkeypatch.setattr(settings, "USAGE_SPOOL_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "USAGE_FLUSH_INTERVAL", 60)
+    return tmp_path
+
+class FakeUsageLogs:
+    def __init__(self):
+        self.rows = {}
+        self.error = None
+        self.gate = None
+
+    async def insert(self, events):
+        if self.gate:
+            await self.gate.wait()
+        error = self.error(events) if callable(self.error) else self.error
+        if error:
+            raise error
+        for event in events:
+            self.rows.setdefault(event["event_id"], event)
+
+    def count(self, user_id):
+        return sum(1 for row in self.rows.values() if row["user_id"] == user_id)
+
+def new_pipeline(monkeypatch, db):
+    pipeline = UsageEventPipeline()
+    monkeypatch.setattr(pipeline, "_insert", db.insert)
+    return pipeline
+
+def crash(pipeline):
+    # The process dies: no final flush, and the spool lock goes with it
+    pipeline._task.cancel()
+    pipeline._spool.close()
+
+def test_spool_is_replayed_exactly_once(monkeypatch):
+    db = FakeUsageLogs()
+
+    async def first_worker():
+        pipeline = new_pipeline(monkeypatch, db)
+        await pipeline.record("u1", "search", count=3)
+        # One batch reaches the database but the spool is never rewritten
+        await db.insert(pipeline._pending[:2])
+        crash(pipeline)
+
+    async def second_worker():
+        pipeline = new_pipeline(monkeypatch, db)
+        await pipeline.start()
+        assert pipeline.stats()["pending"] == 3
+        await pipeline.stop()
+        return pipeline
+
+    asyncio.run(first_worker())
+    pipeline = asyncio.run(second_worker())
+    assert db.count("u1") == 3
+    assert pipeline.stats()["pending"] == 0
+
+def test_live_spool_is_not_replayed(monkeypatch):
+    db = FakeUsageLogs()
+
+    async def go():
+        owner = new_pipeline(monkeypatch, db)
+        await owner.record("u1", "search")
+        other = new_pipeline(monkeypatch, db)
+        await other.start()
+        pending = other.stats()["pending"]
+        await other.stop()
+        await owner.stop()
+        return pending
+
+    assert asyncio.run(go()) == 0
+    assert db.count("u1") == 1
+
+def test_count_is_exact_while_a_batch_is_in_flight(monkeypatch):
+    db = FakeUsageLogs()
+
+    async def go():
+        pipeline = new_pipeline(monkeypatch, db)
+        await pipeline.record("u1", "search", count=2)
+        db.gate = asyncio.Event()
+        flushing = asyncio.create_task(pipeline.flush())
+        await asyncio.sleep(0)
+        await pipeline.record("u1", "search")
+        counts = [await pipeline.count_usage("u1", SINCE, lambda: db.count("u1"))]
+        db.gate.set()
+        await flushing
+        counts.append(await pipeline.count_usage("u1", SINCE, lambda: db.count("u1")))
+        await pipeline.flush()
+        counts.append(await pipeline.count_usage("u1", SINCE, lambda: db.count("u1")))
+        await pipeline.stop()
+        return counts
+
+    assert asyncio.run(go()) == [3, 3, 3]
+
+def test_rows_rejected_for_their_data_are_dropped(monkeypatch):
+    db = FakeUsageLogs()
+    bad = APIError({"code": "23503", "message": "violates foreign key constraint"})
+    db.error = lambda events: bad if any(e["user_id"] == "ghost" for e in events) else None
+
+    async def go():
+        pipeline = new_pipeline(monkeypatch, db)
+        await pipeline.record("u1", "search")
+        await pipeline.record("ghost", "search")
+        await pipeline.record("u2", "search")
+        ok = await pipeline.flush()
+        await pipeline.stop()
+        return ok, pipeline.stats()
+
+    ok, stats = asyncio.run(go())
+    assert ok
+    assert (db.count("u1"), db.count("u2"), db.count("ghost")) == (1, 1, 0)
+    assert stats["dead_lettered"] == 1
+
+@pytest.mark.parametrize("code", ["42P01", "PGRST204", "503"])
+def test_other_errors_keep_the_batch_queued(monkeypatch, write_behind, code):
+    db = FakeUsageLogs()
+    db.error = APIError({"code": code, "message": "unavailable"})
+
+    async def go():
+        pipeline = new_pipeline(monkeypatch, db)
+        await pipeline.record("u1", "search", count=2)
+        ok = await pipeline.flush()
+        stats = pipeline.stats()
+        crash(pipeline)
+        return ok, stats
+
+    ok, stats = asyncio.run(go())
+    assert not ok
+    assert (stats["pending"], stats["dead_lettered"]) == (2, 0)
+    spooled = [line for path in write_behind.iterdir() for line in path.read_text().splitlines()]
+    assert len(spooled) == 2